@@ -0,0 +1,107 @@
+import numpy as np
+
+class AgentTable:
+    """
+    Slot based storage for lattice agents.
+
+    Every agent is a slot index into the array columns `type`, `x`, `y`
+    and `time_since_last_meal`. Creating and removing agents is O(1):
+    slots of dead agents go to a free list and are recycled for new agents.
+
+    Births take effect at once in `create()`. Removed slots are only
+    recycled in `commit()`, which the worlds call at the end of a step, so
+    slots never change their meaning while a step runs. Steps iterate over
+    the snapshot returned by `live()`, which is why agents born during a
+    step only act from the next step on.
+    """
+    COLUMNS = ('type', 'x', 'y', 'time_since_last_meal', 'alive')
+
+    def __init__(self, capacity = 256):
+        self.type = np.zeros(capacity, dtype=np.int8)
+        self.x = np.zeros(capacity, dtype=np.int32)
+        self.y = np.zeros(capacity, dtype=np.int32)
+        self.time_since_last_meal = np.zeros(capacity, dtype=np.int32)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        self.free = list(range(capacity - 1, -1, -1))
+        self.dead = []
+        self.counts = {}
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    @property
+    def capacity(self):
+        return len(self.alive)
+
+    def grow(self):
+        capacity = self.capacity
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate((column, np.zeros_like(column))))
+        self.free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def create(self, type, x, y):
+        if not self.free:
+            self.grow()
+
+        agent = self.free.pop()
+        self.type[agent] = type
+        self.x[agent] = x
+        self.y[agent] = y
+        self.time_since_last_meal[agent] = 0
+        self.alive[agent] = True
+
+        self.counts[type] = self.counts.get(type, 0) + 1
+        return agent
+
+    def remove(self, agent):
+        self.alive[agent] = False
+        self.counts[self.type[agent]] -= 1
+        self.dead.append(agent)
+
+    def set_type(self, agent, type):
+        self.counts[self.type[agent]] -= 1
+        self.counts[type] = self.counts.get(type, 0) + 1
+        self.type[agent] = type
+
+    def move(self, agent, pos):
+        self.x[agent], self.y[agent] = pos
+
+    def pos(self, agent):
+        return int(self.x[agent]), int(self.y[agent])
+
+    def commit(self):
+        """ Recycles the slots of the agents removed since the last commit """
+        self.free.extend(self.dead)
+        self.dead = []
+
+    def live(self):
+        """ Returns the slots of all living agents """
+        return np.flatnonzero(self.alive)
+
+    def count(self, type):
+        return self.counts.get(type, 0)
+
+    def state(self):
+        """ Returns the columns and the free list as arrays, call after commit() """
+        state = dict((name, getattr(self, name)) for name in self.COLUMNS)
+        state['free'] = np.array(self.free, dtype=np.int64)
+        return state
+
+    @classmethod
+    def restore(cls, state):
+        """ Rebuilds a table from state(), including its slot assignment """
+        table = cls(0)
+        for name in cls.COLUMNS:
+            setattr(table, name, np.array(state[name], dtype=getattr(table, name).dtype))
+        table.free = state['free'].tolist()
+
+        types, counts = np.unique(table.type[table.alive], return_counts=True)
+        table.counts = dict(zip(types.tolist(), counts.tolist()))
+        return table
+
+    def positions(self, type = None):
+        """ Returns an (n, 2) array with the positions of the living agents """
+        selected = self.alive if type is None else self.alive & (self.type == type)
+        return np.column_stack((self.x[selected], self.y[selected]))
@@ -0,0 +1,84 @@
+import os
+import copy
+import pickle
+import select
+import traceback
+from rng import child
+
+# Burn-in once, branch many.
+#
+# Replicas that start from the same warmed-up model skip the transient
+# after initialize(). fork_replicas() runs `task(model, replica)` on copies
+# of one model: with os.fork every replica is a child process that shares
+# the memory of the model copy-on-write, elsewhere the model is deep copied.
+# Every copy gets its own child stream of `seed` through model.reseed(), so
+# the replicas diverge from the common state right away.
+#
+# Array models can branch without processes, see BatchModel.branch().
+
+def clone(model, seed):
+    """ Returns a deep copy of `model` that draws from its own stream """
+    model = copy.deepcopy(model)
+    model.reseed(seed)
+    return model
+
+def run_child(model, task, replica, seed, pipe):
+    """ Runs in the forked process and writes (ok, result) to the pipe """
+    try:
+        model.reseed(seed)
+        data = pickle.dumps((True, task(model, replica)), pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        data = pickle.dumps((False, traceback.format_exc()), pickle.HIGHEST_PROTOCOL)
+
+    with os.fdopen(pipe, "wb") as f:
+        f.write(data)
+
+def fork_replicas(model, replicas, task, seed = None, processes = None):
+    """
+    Runs `task(model, replica)` on `replicas` branches of `model`, at most
+    `processes` at once, and returns the results in replica order. The
+    replica with index k draws from child k of `seed`.
+    """
+    seeds = [child(seed, replica) for replica in range(replicas)]
+    processes = processes or os.cpu_count() or 1
+
+    if not hasattr(os, "fork") or processes == 1:
+        return [task(clone(model, seeds[replica]), replica) for replica in range(replicas)]
+
+    results = [None] * replicas
+    pending = list(range(replicas))
+    running = {}
+
+    while pending or running:
+        while pending and len(running) < processes:
+            replica = pending.pop(0)
+            read, write = os.pipe()
+            pid = os.fork()
+
+            if pid == 0:
+                os.close(read)
+                try:
+                    run_child(model, task, replica, seeds[replica], write)
+                finally:
+                    os._exit(0)
+
+            os.close(write)
+            running[read] = (pid, replica)
+
+        # NOTE: The pipes are read before waiting for the children, since a
+        # child blocks on a result that is larger than the pipe buffer
+        ready, _, _ = select.select(list(running), [], [])
+        for read in ready:
+            pid, replica = running.pop(read)
+            with os.fdopen(read, "rb") as f:
+                data = f.read()
+            os.waitpid(pid, 0)
+
+            if not data:
+                raise RuntimeError("Replica %d exited without a result" % replica)
+            ok, value = pickle.loads(data)
+            if not ok:
+                raise RuntimeError("Replica %d failed:\n%s" % (replica, value))
+            results[replica] = value
+
+    return results
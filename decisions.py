@@ -0,0 +1,53 @@
+from __future__ import division
+import math
+
+# Sequential decision rules for replica batches.
+#
+# A rule looks at the replicas of one point that have finished so far and
+# returns its verdict as soon as the remaining replicas can not change it:
+# True (e.g. "goes extinct"), False, or None while it is still open. With
+# Sweep.decide the outstanding replicas of a point are cancelled as soon as
+# the verdict is settled.
+
+class Count:
+    """ True once `count` replicas had the outcome, False once that is impossible """
+    def __init__(self, count = 1):
+        self.count = count
+
+    def decide(self, hits, total, replicas):
+        if hits >= self.count:
+            return True
+        if hits + (replicas - total) < self.count:
+            return False
+        return None
+
+def any_outcome():
+    """ True as soon as one replica has the outcome, False if none has it """
+    return Count(1)
+
+def fraction(level, replicas):
+    """ True if at least the fraction `level` of the replicas has the outcome """
+    return Count(max(1, int(math.ceil(level * replicas - 1e-9))))
+
+class SPRT:
+    """
+    Wald's sequential probability ratio test of the outcome probability,
+    p <= p0 (False) against p >= p1 (True), with error rates alpha and beta.
+    If the replicas run out first, the side of the log likelihood ratio
+    between the two decision bounds is taken.
+    """
+    def __init__(self, p0, p1, alpha = 0.05, beta = 0.05):
+        self.hit = math.log(p1 / p0)
+        self.miss = math.log((1 - p1) / (1 - p0))
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+
+    def decide(self, hits, total, replicas):
+        ratio = hits * self.hit + (total - hits) * self.miss
+        if ratio >= self.upper:
+            return True
+        if ratio <= self.lower:
+            return False
+        if total >= replicas:
+            return ratio >= (self.upper + self.lower) / 2
+        return None
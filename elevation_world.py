@@ -1,68 +1,100 @@
 import random
 import numpy as np
 import numpy.random
-from scipy.misc import imread
 
 from environment import World as BaseWorld
 from environment import WorldRenderer as BaseWorldRenderer
+from agents import AgentTable
+from occupancy import OccupancyGrid
+from neighborhood import neighbor_table
+from maps import load_map
+from transitions import TransitionTable
+from rng import RandomBlock, get_state, set_state
+import snapshot
 
-class Agent:
-    pass
+PREY = 1
+PREDATOR = 2
 
 class ElevationWorld(BaseWorld):
     SETTINGS =  [
         ("Number of Agents",    "numberOfAgents",       int,    '100'),
         ("Movement Rate",       "movementRate",         float,  '0.5'),
         ("Elevation file",       "elevationMap",         str,  'testmap.png'),
+        ("Random Seed",         "seed",                 int,    '-1'),
     ]
 
     def __init__(self, settings):
         BaseWorld.__init__(self, settings)
-        self.elevation = imread(self.settings['elevationMap'], flatten = True)
+        self.random = RandomBlock(self.seed())
+        self.t = 0
+        self.preferred_elevation = 0.9
+        self.load_elevation(self.settings['elevationMap'])
+        self.agents = AgentTable()
+        for i in range(settings['numberOfAgents']):
+            self.generate_agent()
+        self.agents.commit()
+
+    def load_elevation(self, filename):
+        self.elevation_file = filename
+        self.elevation = load_map(filename)
         self.size = self.elevation.shape[0]
-        self.lattice = [[[] for _ in range(self.size)] for _ in range(self.size)]
-        self.agents = [self.generate_agent() 
-                       for i in range(settings['numberOfAgents'])]
+        self.lattice = OccupancyGrid((self.size, self.size))
+        self.neighbor_table = neighbor_table((self.size, self.size))
+        self.transitions = TransitionTable(self.elevation, self.preferred_elevation,
+                                           self.neighbor_table)
 
     def generate_agent(self):
-        agent = Agent()
         while True:
-            agent.x = random.randrange(self.size)
-            agent.y = random.randrange(self.size)
-            if self.is_valid_position((agent.x, agent.y)):
+            x = self.random.randrange(self.size)
+            y = self.random.randrange(self.size)
+            if self.is_valid_position((x, y)):
                 break
-        agent.preferred_elevation = 0.9
-        agent.type = random.choice(("Prey", "Predator"))
-        self.lattice[agent.x][agent.y].append(agent)
+        agent = self.agents.create(self.random.choice((PREY, PREDATOR)), x, y)
+        self.lattice.place(agent, (x, y))
         return agent
 
     def step(self):
-        for agent in self.agents: 
-            self.move(agent)
-
-    def move(self, agent):
-        if random.random() < self.settings['movementRate']:
+        live = self.agents.live()
+        draws = self.random.uniforms(2 * len(live)).reshape(-1, 2).tolist()
+        for agent, (u, v) in zip(live.tolist(), draws):
+            self.move(agent, u, v)
+        self.agents.commit()
+        self.t += 1
+
+    def save_state(self, filename):
+        """ Writes the map file, the agents, the RNG state and the step counter to a .npz snapshot """
+        snapshot.save(filename,
+                      elevation_file = snapshot.encode(self.elevation_file),
+                      t = self.t,
+                      random = snapshot.encode(get_state(self.random)),
+                      **self.agents.state())
+
+    def load_state(self, filename):
+        """ Replaces the state of the world by a snapshot of save_state """
+        state = snapshot.load(filename)
+        self.load_elevation(snapshot.decode(state['elevation_file']))
+        self.agents = AgentTable.restore(state)
+        for agent in self.agents.live():
+            self.lattice.place(agent, self.agents.pos(agent))
+        self.t = int(state['t'])
+        set_state(self.random, snapshot.decode(state['random']))
+
+    def move(self, agent, u, v):
+        """ Moves with probability `u`, picking the neighbor with `v` """
+        if u < self.settings['movementRate']:
             # prefer directions that lead closer to preferred elevation
-            directions = ((1,0), (-1,0), (0,1), (0,-1))
-            new_positions = filter(self.is_valid_position, 
-                        ((agent.x + dx, agent.y + dy) for (dx, dy) in directions))
-            weights = [1 / abs(self.elevation[new_pos] - agent.preferred_elevation)
-                       for new_pos in new_positions]
-            probabilities = np.array(weights) / np.sum(weights)
-            i = np.random.choice(len(new_positions), p=probabilities)
-            new_x, new_y = new_positions[i]
-            self.lattice[agent.x][agent.y].remove(agent)
-            self.lattice[new_x][new_y].append(agent)
-            agent.x, agent.y = new_x, new_y
+            pos = self.agents.pos(agent)
+            new_pos = self.transitions.choose(pos, self.is_valid_position, v)
+            if new_pos is None:
+                return
+            self.lattice.move(pos, new_pos)
+            self.agents.move(agent, new_pos)
 
     def is_valid_position(self, pos):
-        x, y = pos
-        out_of_bounds = ((x < 0) or (x >= self.size) or 
-                        (y < 0) or (y >= self.size))
-        if out_of_bounds:
-            return False
-        occupied = self.lattice[x][y]
-        return not occupied
+        return self.lattice.is_empty(pos)
+
+# Colours of the agent types
+PALETTE = {PREY: (0.0, 1.0, 0.0), PREDATOR: (0.0, 0.0, 1.0)}
 
 class ElevationWorldRenderer(BaseWorldRenderer):
     SETTINGS = []
@@ -86,11 +118,8 @@ class ElevationWorldRenderer(BaseWorldRenderer):
         render.background(self.world.settings["elevationMap"])
         
         # Render the agents with a different color for the two types
-        for agent in self.world.agents:
-            green = (0.0, 1.0, 0.0)
-            blue  = (0.0, 0.0, 1.0)
-            color = {"Prey": green, "Predator": blue}[agent.type]
-            render.agent((agent.x, agent.y), color)
+        agents = self.world.agents
+        render.agents(agents.positions(), agents.type[agents.alive], PALETTE)
 
 # If the script is executed as the main script
 if __name__ == '__main__':
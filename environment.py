@@ -18,10 +18,24 @@ class World:
 	def __init__(self, settings):
 		self.settings = settings
 
+	def seed(self):
+		""" Returns the "seed" setting, None (fresh entropy) if missing or negative """
+		seed = self.settings.get('seed', -1)
+		if seed is None or seed < 0: return None
+		return seed
+
 	def step(self):
 		""" Performs a single time step """
 		raise NotImplemented()
 
+	def save_state(self, filename):
+		""" Writes the state of the world to a snapshot file """
+		raise NotImplementedError()
+
+	def load_state(self, filename):
+		""" Replaces the state of the world by a snapshot file """
+		raise NotImplementedError()
+
 class WorldRenderer:
 	""" 
 	Abstract World renderer class.
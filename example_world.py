@@ -1,5 +1,6 @@
 import random
-from math import sqrt
+from math import sqrt, floor, ceil
+from functools import lru_cache
 import numpy as np
 
 # This is an example world that does the following:
@@ -14,6 +15,20 @@ import numpy as np
 
 from environment import World as BaseWorld
 from environment import WorldRenderer as BaseWorldRenderer
+from rng import RandomBlock, get_state, set_state
+import snapshot
+
+# The lake is a static layer: a mask of the valid cells [x, y], x and y in
+# 0..size, computed once per (size, radius) and shared by the world's
+# validity checks and the renderer.
+@lru_cache(maxsize = 16)
+def lake_mask(size, radius):
+	""" Returns the read only mask of the cells outside of the central lake """
+	center = size / 2
+	x, y = np.ogrid[0:size + 1, 0:size + 1]
+	mask = (x - center)**2 + (y - center)**2 >= radius**2
+	mask.setflags(write = False)
+	return mask
 
 # The agent class... only holding a position
 class ExampleAgent:
@@ -32,20 +47,34 @@ class ExampleWorld(BaseWorld):
 		("Number of Agents", 	"numberOfAgents",		int, 	'100'),
 		("World Size", 			"size", 				int, 	'200'),
 		("Lake Radius", 		"radius", 				int,	'50'),
-		("Movement Rate",		"movementRate",			float, 	'0.3')
+		("Movement Rate",		"movementRate",			float, 	'0.3'),
+		("Random Seed",			"seed",					int,	'-1')
 	]
 
+	@property
+	def lake(self):
+		return lake_mask(self.settings['size'], self.settings['radius'])
+
 	# Just validate the position (within the world boundaries? not within the lake?)
 	def is_valid_position(self, x, y):
 		""" Checks if a position is outside of the lake """
 		size = self.settings['size']
-		center = size / 2
-		radius = self.settings['radius']
 
 		if x < 0 or y < 0: return False
 		if x > size or y > size: return False
 
-		return (x - center)**2 + (y - center)**2 >= radius**2
+		return bool(self.lake[int(x), int(y)])
+
+	def valid_positions(self, x, y):
+		""" Checks arrays of positions at once, see is_valid_position """
+		x = np.asarray(x)
+		y = np.asarray(y)
+		size = self.settings['size']
+
+		inside = (x >= 0) & (y >= 0) & (x <= size) & (y <= size)
+		valid = np.zeros(x.shape, dtype = bool)
+		valid[inside] = self.lake[x[inside].astype(int), y[inside].astype(int)]
+		return valid
 
 	# Generate an agent with a reasonable starting positions outside of the lake
 	def generate_agent(self):
@@ -54,19 +83,19 @@ class ExampleWorld(BaseWorld):
 		center = size / 2
 		radius = self.settings['radius']
 
-		x = round(random.random() * size)
+		x = round(self.random.random() * size)
 
 		if x < center - radius or x > center + radius:
-			y = random.random() * size
+			y = round(self.random.random() * size)
 		else:
-			if random.random() > 0.5: 
+			if self.random.random() > 0.5: 
 				# left side of the lake
 				y_max = center - sqrt(radius**2 - (x - center)**2)
-				y = random.random() * y_max
+				y = floor(self.random.random() * y_max)
 			else: 
 				# right side of the lake
 				y_min = center + sqrt(radius**2 - (x - center)**2)
-				y = y_min + (size - y_min) * random.random()
+				y = ceil(y_min + (size - y_min) * self.random.random())
 
 		return ExampleAgent(x, y)
 
@@ -74,25 +103,42 @@ class ExampleWorld(BaseWorld):
 	def __init__(self, settings):
 		""" Inits the agents """
 		BaseWorld.__init__(self, settings)
+		self.random = RandomBlock(self.seed())
+		self.t = 0
 		self.agents = [self.generate_agent() for i in range(settings['numberOfAgents'])]
 
 	# The movement happens with a certain probability and 
 	# it should not end outside of the world or in the lake...
-	def move(self, agent):
-		if random.random() < self.settings['movementRate']:
-			(x, y) = (agent.x, agent.y)
-
-			x += round((random.random() - 0.5) * 2.0)
-			y += round((random.random() - 0.5) * 2.0)
-
-			if self.is_valid_position(x, y):
-				(agent.x, agent.y) = (x, y)
-
 	# Not much happening here, because the agents should 
 	# only move. No predator-prey behavior yet or anything yet!
+	# Agents do not interact, so all of them move at once
 	def step(self):
 		""" Performs one step of the lake world """
-		for agent in self.agents: self.move(agent)
+		u, dx, dy = self.random.uniforms(3 * len(self.agents)).reshape(-1, 3).T
+		x = np.array([agent.x for agent in self.agents]) + np.round((dx - 0.5) * 2.0)
+		y = np.array([agent.y for agent in self.agents]) + np.round((dy - 0.5) * 2.0)
+
+		moves = (u < self.settings['movementRate']) & self.valid_positions(x, y)
+		for i in np.flatnonzero(moves).tolist():
+			(self.agents[i].x, self.agents[i].y) = (int(x[i]), int(y[i]))
+		self.t += 1
+
+	# Snapshots hold the agent positions, the RNG state and the step counter
+	def save_state(self, filename):
+		""" Writes the world to a .npz snapshot """
+		snapshot.save(filename,
+			x = np.array([agent.x for agent in self.agents]),
+			y = np.array([agent.y for agent in self.agents]),
+			t = self.t,
+			random = snapshot.encode(get_state(self.random))
+		)
+
+	def load_state(self, filename):
+		""" Replaces the world by a snapshot of save_state """
+		state = snapshot.load(filename)
+		self.agents = [ExampleAgent(x, y) for x, y in zip(state['x'].tolist(), state['y'].tolist())]
+		self.t = int(state['t'])
+		set_state(self.random, snapshot.decode(state['random']))
 
 # While the World defines the simulation itself, the WorldRenderer
 # defines how to display the world. The basic renderer defines
@@ -109,6 +155,11 @@ class ExampleWorld(BaseWorld):
 #	 This methods renders a single agent with a certain color
 #    at a certain grid position.
 #
+#    - render_agents(positions, colors)
+#
+#    This method renders many agents in one call, grouped by
+#    their color (or their index into a palette of colors).
+#
 #    As for the world, some settings can be defined for the 
 #    renderer with the static SETTINGS variable.
 #
@@ -130,11 +181,7 @@ class ExampleWorldRenderer(BaseWorldRenderer):
 
 	def update_field(self):
 		size = self.world.settings['size']
-		self.field = np.zeros((size, size))
-
-		for x in range(size):
-			for y in range(size):
-				self.field[x, y] = self.world.is_valid_position(x, y) * 1.0
+		self.field = self.world.lake[:size, :size] * 1.0
 
 	def render(self, render):
 		# Render the field (the lake) if the settings is True
@@ -144,11 +191,11 @@ class ExampleWorldRenderer(BaseWorldRenderer):
 		render.set_size((size, size))
 
 		if self.settings['showLake']:
-			render.field(self.field, (0.0, 0.0, 1.0), self.world.settings['radius'])
+			render.field(self.field, (0.0, 0.0, 1.0))
 
-		# Render the agents with a different color for the two types
-		for agent in self.world.agents:
-			render.agent((agent.x, agent.y), (0.0, 0.0, 0.0))
+		# Render all agents at once, in black
+		positions = [(agent.x, agent.y) for agent in self.world.agents]
+		render.agents(positions, (0.0, 0.0, 0.0))
 
 # If the script is executed as the main script
 if __name__ == '__main__':
@@ -1,8 +1,16 @@
 from gi.repository import Gtk, Gdk, GLib, GObject
 
-import cairo
+import time
+import threading
 import util
-import numpy as np
+from render import CairoRenderer, Scene
+
+# Default frame rate of the canvas and steps of the world per frame
+FRAME_RATE = 25
+STEPS_PER_FRAME = 1
+
+# Seconds between two updates of the steps/s readout
+RATE_INTERVAL = 0.5
 
 class RenderArea(Gtk.DrawingArea):
     def __init__(self):
@@ -78,11 +86,32 @@ class MainWindow(Gtk.Window):
         self.startStopButton = Gtk.Button('Run')
         self.resetWorldButton = Gtk.Button('Reset World')
         self.resetSettingsButton = Gtk.Button('Reset Settings')
+        self.saveStateButton = Gtk.Button('Save State')
+        self.loadStateButton = Gtk.Button('Load State')
+
+        self.frameRateSpin = Gtk.SpinButton.new_with_range(1, 120, 1)
+        self.frameRateSpin.set_value(FRAME_RATE)
+        self.stepsPerFrameSpin = Gtk.SpinButton.new_with_range(1, 1000000, 1)
+        self.stepsPerFrameSpin.set_value(STEPS_PER_FRAME)
+        self.maxSpeedCheck = Gtk.CheckButton('Max Speed')
+        self.maxSpeedCheck.set_active(True)
+        self.rateLabel = Gtk.Label('0 steps/s')
+
+        speedPanel = Gtk.Grid()
+        speedPanel.attach(Gtk.Label('Frames/s'), 0, 0, 1, 1)
+        speedPanel.attach(self.frameRateSpin, 1, 0, 1, 1)
+        speedPanel.attach(Gtk.Label('Steps/Frame'), 0, 1, 1, 1)
+        speedPanel.attach(self.stepsPerFrameSpin, 1, 1, 1, 1)
+        speedPanel.attach(self.maxSpeedCheck, 0, 2, 1, 1)
+        speedPanel.attach(self.rateLabel, 1, 2, 1, 1)
 
         self.controlPanel = Gtk.VBox()
         self.controlPanel.pack_start(self.startStopButton, True, True, 0)
         self.controlPanel.pack_start(self.resetWorldButton, True, True, 0)
         self.controlPanel.pack_start(self.resetSettingsButton, True, True, 0)
+        self.controlPanel.pack_start(self.saveStateButton, True, True, 0)
+        self.controlPanel.pack_start(self.loadStateButton, True, True, 0)
+        self.controlPanel.pack_start(speedPanel, True, True, 0)
 
     def setup_canvas_panel(self):
         self.canvas = RenderArea()
@@ -118,6 +147,22 @@ class MainWindow(Gtk.Window):
         column = Gtk.TreeViewColumn("Value", self.create_treeview_renderer("renderer"), text = 1)
         self.rendererSettingsTree.append_column(column = column)
 
+    def choose_file(self, title, action, button):
+        """ Asks for a snapshot file, returns None if the dialog is cancelled """
+        dialog = Gtk.FileChooserDialog(title, self, action,
+            (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL, button, Gtk.ResponseType.OK))
+
+        snapshots = Gtk.FileFilter()
+        snapshots.set_name("Snapshots")
+        snapshots.add_pattern("*.npz")
+        dialog.add_filter(snapshots)
+
+        filename = None
+        if dialog.run() == Gtk.ResponseType.OK:
+            filename = dialog.get_filename()
+        dialog.destroy()
+        return filename
+
     def on_treeview_edit(self, widget, path, value, purpose):
         if purpose == "world":
             resolver = self.worldSettingsResolver
@@ -132,102 +177,75 @@ class MainWindow(Gtk.Window):
         definition = resolver.definitions[name]
         item[1] = definition.transformToString(resolver.settings[name])
 
-class CairoRenderer:
-    def __init__(self, worldRenderer):
-        self.size = (100, 100)
-        self.rect = (0, 0)
-        self.worldRenderer = worldRenderer
-        self.sx = 1.0
-        self.sy = 1.0
-        self.ctx = None
-        self.cache = {}
-
-    def agent(self, position, color):
-        self.ctx.set_source_rgb(color[0], color[1], color[2])
-        self.ctx.arc(
-            position[0] * self.sx, 
-            position[1] * self.sy,
-            self.sx, 0, 2 * np.pi
-        )
-        self.ctx.fill()
-        
-    def background(self, filename):
-        try:
-            image = self.cache[filename]
-        except:
-            image = cairo.ImageSurface.create_from_png(filename)
-            self.cache[filename] = image
-        
-        # calculate image size
-        img_height = image.get_height()
-        img_width = image.get_width()
-        width_ratio = float(self.rect[0]) / float(img_width)
-        height_ratio = float(self.rect[1]) / float(img_height)
-        
-        # scale image and add it
-        self.ctx.save()
-        self.ctx.scale(width_ratio, height_ratio)
-        self.ctx.set_source_surface(image)
-        self.ctx.paint()
-        self.ctx.restore()
-
-    def field(self, field, color, cache_id = None):
-        if cache_id in self.cache:
-            self.ctx.set_source_surface(self.cache[cache_id])
-            self.ctx.paint()
-            return
-
-        image = cairo.ImageSurface(cairo.FORMAT_ARGB32, self.rect[0], self.rect[1])
-        ctx = cairo.Context(image)
-
-        for x in range(self.size[0]):
-            for y in range(self.size[1]):
-                ctx.set_source_rgba(
-                    color[0],
-                    color[1],
-                    color[2],
-                    1.0 - field[x, y]
-                )
-                ctx.rectangle(
-                    x * self.sx, y * self.sy,
-                    self.sx, self.sy
-                )
-                ctx.fill()
-
-        self.ctx.set_source_surface(image)
-        self.ctx.paint()
-
-        if cache_id is not None:
-            self.cache[cache_id] = image
-
-    def set_size(self, size):
-        self.update_geometry(size, self.rect)
-
-    def update_geometry(self, size, rect, enforce = False):
-        changed = False
-
-        if size[0] != self.size[0] or size[1] != self.size[1]:
-            self.size = size
-            changed = True
-
-        if self.rect[0] != rect[0] or self.rect[1] != rect[1]:
-            self.rect = rect
-            changed = True
-
-        if changed or enforce:
-            self.sx = float(self.rect[0]) / float(self.size[0])
-            self.sy = float(self.rect[1]) / float(self.size[1])
-            self.cache = {}
-
-    def render(self, ctx, rect):
-        self.update_geometry(self.size, (rect.width, rect.height))
-        self.ctx = ctx
-
-        self.ctx.rectangle(0, 0, self.rect[0], self.rect[1])
-        self.ctx.set_source_rgb(1.0, 1.0, 1.0)
-        self.ctx.fill()
-
-        self.worldRenderer.render(self)
+class Simulation(threading.Thread):
+    """
+    Steps the world of an Environment in the background, so that the speed
+    of the simulation does not depend on the cost of drawing it. Steps run
+    under `lock`. After a step, whenever a new frame was asked for, the
+    drawing calls of the world renderer are captured as a Scene and
+    published under the short `scene_lock`. The canvas draws the latest
+    scene and never waits for a step.
+
+    With `max_speed` the world steps continuously, otherwise it takes
+    `steps_per_frame` steps whenever next_frame() is called.
+    """
+    def __init__(self, environment):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.environment = environment
+        self.lock = threading.Lock()
+        self.scene_lock = threading.Lock()
+        self.running = threading.Event()
+        self.frame = threading.Event()
+        self.capture = threading.Event()
+
+        self.steps_per_frame = STEPS_PER_FRAME
+        self.max_speed = True
+        self.steps = 0
+        self.scene = None
+
+    def next_frame(self):
+        self.capture.set()
+        self.frame.set()
+
+    def publish(self):
+        """ Captures the world as the latest scene, the caller holds `lock` """
+        scene = Scene(self.environment.worldRendererInstance)
+        with self.scene_lock:
+            self.scene = scene
+
+    def latest(self):
+        """ Returns the latest scene, a fresh one if no step is running """
+        if self.lock.acquire(False):
+            try:
+                self.publish()
+            finally:
+                self.lock.release()
+
+        with self.scene_lock:
+            return self.scene
+
+    def run(self):
+        while True:
+            self.running.wait()
+
+            count = 1
+            if not self.max_speed:
+                self.frame.wait()
+                self.frame.clear()
+                count = self.steps_per_frame
+
+            with self.lock:
+                for _ in range(count):
+                    if not self.running.is_set():
+                        break
+                    self.environment.worldInstance.step()
+                    self.steps += 1
+
+                if self.capture.is_set():
+                    self.capture.clear()
+                    self.publish()
 
 class Environment:
     def __init__(self, World, WorldRenderer, settings = dict()):
@@ -250,31 +268,71 @@ class Environment:
         self.worldRendererInstance = WorldRenderer(self.worldInstance, self.rendererSettingsResolver.settings)
 
         self.cairoRenderer = CairoRenderer(self.worldRendererInstance)
-        self.mainWindow.canvas.renderer = self.cairoRenderer.render
+        self.mainWindow.canvas.renderer = self.draw
+
+        self.simulation = Simulation(self)
+        self.simulation.start()
 
         self.workerInstance = None
         self.started = False
         self.running = False
+        self.rateTime = time.time()
+        self.rateSteps = 0
 
         self.mainWindow.startStopButton.connect("clicked", self.on_start_stop)
         self.mainWindow.resetWorldButton.connect("clicked", self.on_reset_world)
         self.mainWindow.resetSettingsButton.connect("clicked", self.on_reset_settings)
+        self.mainWindow.saveStateButton.connect("clicked", self.on_save_state)
+        self.mainWindow.loadStateButton.connect("clicked", self.on_load_state)
+        self.mainWindow.frameRateSpin.connect("value-changed", self.on_frame_rate)
+        self.mainWindow.stepsPerFrameSpin.connect("value-changed", self.on_steps_per_frame)
+        self.mainWindow.maxSpeedCheck.connect("toggled", self.on_max_speed)
+
+    def draw(self, ctx, rect):
+        scene = self.simulation.latest()
+        if scene is not None:
+            self.cairoRenderer.render(ctx, rect, scene)
 
     def worker(self):
+        """ Called every frame: redraws the canvas and updates the steps/s readout """
         self.mainWindow.canvas.queue_draw()
-        self.worldInstance.step()
+        self.simulation.next_frame()
+
+        now = time.time()
+        if now - self.rateTime >= RATE_INTERVAL:
+            steps = self.simulation.steps
+            rate = (steps - self.rateSteps) / (now - self.rateTime)
+            self.mainWindow.rateLabel.set_text('%d steps/s' % rate)
+            self.rateTime, self.rateSteps = now, steps
+
         return self.running
 
     def start_worker(self):
         if not self.running:
-            self.workerInstance = GObject.timeout_add(1, self.worker)
+            interval = int(1000 / self.mainWindow.frameRateSpin.get_value())
+            self.workerInstance = GObject.timeout_add(max(interval, 1), self.worker)
             self.running = True
+            self.simulation.running.set()
 
     def stop_worker(self):
         if self.running:
             self.running = False
+            self.simulation.running.clear()
             GObject.source_remove(self.workerInstance)
             self.workerInstance = None
+            self.mainWindow.rateLabel.set_text('0 steps/s')
+
+    def on_frame_rate(self, widget):
+        if self.running:
+            self.stop_worker()
+            self.start_worker()
+
+    def on_steps_per_frame(self, widget):
+        self.simulation.steps_per_frame = widget.get_value_as_int()
+
+    def on_max_speed(self, widget):
+        self.simulation.max_speed = widget.get_active()
+        self.simulation.next_frame()
 
     def on_start_stop(self, widget):
         if not self.started:
@@ -287,8 +345,24 @@ class Environment:
             widget.set_label('Run')
 
     def on_reset_world(self, widget):
-        self.worldRendererInstance = WorldRenderer(self.worldInstance, self.rendererSettingsResolver.settings)
-        self.worldInstance = self.World(self.worldSettingsResolver.settings)
+        with self.simulation.lock:
+            self.worldRendererInstance = WorldRenderer(self.worldInstance, self.rendererSettingsResolver.settings)
+            self.worldInstance = self.World(self.worldSettingsResolver.settings)
+
+    def on_save_state(self, widget):
+        filename = self.mainWindow.choose_file("Save State", Gtk.FileChooserAction.SAVE, Gtk.STOCK_SAVE)
+        if filename is not None:
+            if not filename.endswith(".npz"):
+                filename += ".npz"
+            with self.simulation.lock:
+                self.worldInstance.save_state(filename)
+
+    def on_load_state(self, widget):
+        filename = self.mainWindow.choose_file("Load State", Gtk.FileChooserAction.OPEN, Gtk.STOCK_OPEN)
+        if filename is not None:
+            with self.simulation.lock:
+                self.worldInstance.load_state(filename)
+            self.mainWindow.canvas.queue_draw()
 
     def on_reset_settings(self, widget):
         self.worldSettingsResolver.resolve(self.defaultSettings, True)
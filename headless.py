@@ -0,0 +1,166 @@
+import os
+import sys
+import queue
+import argparse
+import importlib
+import threading
+
+import cairo
+import numpy as np
+import util
+from render import CairoRenderer
+
+# Headless environment.
+#
+# Runs a World/WorldRenderer pair like gui.Environment, but without a
+# display: every frame is drawn into an offscreen cairo image surface and
+# handed to a writer thread, while the world takes the next `steps` steps.
+# The writer stores the frames as a PNG sequence or as one stream of raw
+# RGB frames (24 bit, row by row), e.g. for
+#
+#   python headless.py example_world ExampleWorld ExampleWorldRenderer \
+#       --frames 1000 --steps 10 --format rgb --output - |
+#   ffmpeg -f rawvideo -pix_fmt rgb24 -s 400x400 -i - run.mp4
+
+# Frames that wait for the writer before the simulation blocks
+QUEUE_SIZE = 16
+
+def rgb(data, width, height, stride):
+    """ Converts the data of an ARGB32 surface (opaque) to packed RGB bytes """
+    pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, stride // 4, 4)[:, :width]
+    # NOTE: ARGB32 pixels are native endian words, i.e. B, G, R, A bytes on little endian machines
+    order = [2, 1, 0] if sys.byteorder == 'little' else [1, 2, 3]
+    return np.ascontiguousarray(pixels[:, :, order]).tobytes()
+
+class FrameWriter(threading.Thread):
+    """
+    Writes the frames of a queue in the background: PNG files in the
+    directory `output` or raw RGB frames to the file `output` ('-' is stdout).
+    """
+    def __init__(self, output, format, width, height, stride):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.output = output
+        self.format = format
+        self.width = width
+        self.height = height
+        self.stride = stride
+
+        self.frames = queue.Queue(QUEUE_SIZE)
+        self.finished = False
+        self.error = None
+        self.count = 0
+
+    def write(self, data):
+        if self.error is not None:
+            raise self.error
+        self.frames.put(data)
+
+    def run(self):
+        try:
+            if self.format == 'png':
+                self.write_png()
+            elif self.format == 'rgb':
+                self.write_rgb()
+            else:
+                raise ValueError("Unknown frame format: %s" % self.format)
+        except Exception as error:
+            self.error = error
+            # NOTE: Keeps taking frames, so that the simulation does not block
+            while not self.finished and self.frames.get() is not None:
+                pass
+
+    def write_png(self):
+        if not os.path.exists(self.output):
+            os.makedirs(self.output)
+
+        for data in iter(self.frames.get, None):
+            surface = cairo.ImageSurface.create_for_data(bytearray(data), cairo.FORMAT_ARGB32,
+                                                         self.width, self.height, self.stride)
+            surface.write_to_png(os.path.join(self.output, 'frame_%06d.png' % self.count))
+            self.count += 1
+        self.finished = True
+
+    def write_rgb(self):
+        stream = sys.stdout.buffer if self.output == '-' else open(self.output, 'wb')
+        try:
+            for data in iter(self.frames.get, None):
+                stream.write(rgb(data, self.width, self.height, self.stride))
+                self.count += 1
+            self.finished = True
+        finally:
+            if stream is sys.stdout.buffer:
+                stream.flush()
+            else:
+                stream.close()
+
+    def close(self):
+        """ Waits until all frames are written """
+        self.frames.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+class Environment:
+    def __init__(self, World, WorldRenderer, settings = dict(), width = 400, height = 400):
+        self.worldSettingsResolver = util.SettingsResolver(World.SETTINGS)
+        self.rendererSettingsResolver = util.SettingsResolver(WorldRenderer.SETTINGS)
+
+        self.worldSettingsResolver.resolve(settings)
+        self.rendererSettingsResolver.resolve(settings)
+
+        self.worldInstance = World(self.worldSettingsResolver.settings)
+        self.worldRendererInstance = WorldRenderer(self.worldInstance, self.rendererSettingsResolver.settings)
+
+        self.width = width
+        self.height = height
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        self.context = cairo.Context(self.surface)
+        self.cairoRenderer = CairoRenderer(self.worldRendererInstance)
+
+    def frame(self):
+        """ Draws the world and returns a copy of the surface data """
+        self.cairoRenderer.draw(self.context, self.width, self.height)
+        self.surface.flush()
+        return bytes(self.surface.get_data())
+
+    def run(self, frames, steps = 1, output = 'frames', format = 'png'):
+        """
+        Writes `frames` frames, the world takes `steps` steps between two
+        frames. Returns the number of frames written.
+        """
+        writer = FrameWriter(output, format, self.width, self.height, self.surface.get_stride())
+        writer.start()
+
+        try:
+            for _ in range(frames):
+                writer.write(self.frame())
+                for _ in range(steps):
+                    self.worldInstance.step()
+        finally:
+            writer.close()
+
+        return writer.count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Renders a world without a display')
+    parser.add_argument('module', help = 'module of the world, e.g. example_world')
+    parser.add_argument('world', help = 'World class')
+    parser.add_argument('renderer', help = 'WorldRenderer class')
+    parser.add_argument('--frames', type = int, default = 100)
+    parser.add_argument('--steps', type = int, default = 1, help = 'world steps per frame')
+    parser.add_argument('--format', choices = ('png', 'rgb'), default = 'png')
+    parser.add_argument('--output', default = 'frames', help = 'directory (png) or file, - for stdout (rgb)')
+    parser.add_argument('--size', default = '400x400', help = 'frame size, WIDTHxHEIGHT')
+    parser.add_argument('--set', action = 'append', default = [], metavar = 'NAME=VALUE',
+                        help = 'world or renderer setting')
+    args = parser.parse_args()
+
+    module = importlib.import_module(args.module)
+    width, height = (int(value) for value in args.size.split('x'))
+    settings = dict(setting.split('=', 1) for setting in args.set)
+
+    env = Environment(getattr(module, args.world), getattr(module, args.renderer), settings, width, height)
+    count = env.run(args.frames, args.steps, args.output, args.format)
+    sys.stderr.write("%d frames\n" % count)
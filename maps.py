@@ -0,0 +1,52 @@
+import os
+import hashlib
+import numpy as np
+
+# Cache of terrain maps that are stored as images.
+#
+# Every image is decoded once into a float32 grayscale array in
+# CACHE_DIRECTORY. Afterwards the array is loaded memory mapped, so world
+# resets do not decode the image again and worker processes that load the
+# same map (pass the filename, not the array) share one page-cache copy.
+# The cache entry is keyed by path, size and modification time of the image.
+# Images are decoded with matplotlib, which is only imported on a cache miss.
+
+BASE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIRECTORY = os.path.join(BASE_DIRECTORY, "cache", "maps")
+
+def cache_filename(filename, cache_directory = None):
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+    key = "{}:{}:{}".format(path, stat.st_size, stat.st_mtime)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    name = "{}_{}.npy".format(os.path.splitext(os.path.basename(path))[0], digest)
+    return os.path.join(cache_directory or CACHE_DIRECTORY, name)
+
+def decode(filename):
+    """ Grayscale of an image in [0, 255], as scipy.misc.imread(flatten = True) returned it """
+    from matplotlib.image import imread
+    image = imread(filename)
+    # NOTE: PNG images are read as floats in [0, 1], other formats as bytes
+    if image.dtype.kind == 'f':
+        image = image * 255.0
+    if image.ndim == 3:
+        image = image[:, :, :3].dot([0.299, 0.587, 0.114])
+    return image.astype(np.float32)
+
+def load_map(filename, cache_directory = None):
+    """ Returns the grayscale elevation of an image as a read-only float32 array """
+    cached = cache_filename(filename, cache_directory)
+
+    if not os.path.exists(cached):
+        elevation = decode(filename)
+
+        directory = os.path.dirname(cached)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        temporary = "{}.{}.tmp".format(cached, os.getpid())
+        with open(temporary, "wb") as f:
+            np.save(f, elevation)
+        os.rename(temporary, cached)
+
+    return np.load(cached, mmap_mode = "r")
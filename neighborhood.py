@@ -0,0 +1,100 @@
+import numpy as np
+
+# Precomputed neighbor tables.
+#
+# Cells are addressed by their flat index x * height + y (numpy's C order).
+# A table is built once per lattice shape, boundary mode and stencil and
+# then shared by every model that asks for the same combination:
+#
+#   table = neighbor_table((100, 100), BOUNDED, VON_NEUMANN)
+#   table[cell]         # flat indices of the neighbors of one cell (CSR slice)
+#   table.dense[cells]  # (n, k) neighbors of many cells, -1 if out of bounds
+#   table.positions(pos)  # neighbors of one (x, y) position as tuples
+#
+# choose() picks one of the allowed neighbors of many agents at once.
+
+BOUNDED = "bounded"
+PERIODIC = "periodic"
+
+VON_NEUMANN = ((1,0), (-1,0), (0,1), (0,-1))
+MOORE = VON_NEUMANN + ((1,1), (1,-1), (-1,1), (-1,-1))
+
+# Adds the cell itself as first option, as used by the model3 moves
+def with_center(directions):
+    return ((0,0),) + tuple(directions)
+
+class NeighborTable:
+    def __init__(self, shape, boundary = BOUNDED, directions = VON_NEUMANN):
+        self.shape = tuple(shape)
+        self.boundary = boundary
+        self.directions = tuple(directions)
+
+        width, height = self.shape
+        x, y = np.indices(self.shape)
+        x, y = x.reshape(-1), y.reshape(-1)
+        dx = np.array([d[0] for d in self.directions], dtype=int)
+        dy = np.array([d[1] for d in self.directions], dtype=int)
+
+        nx = x[:, None] + dx
+        ny = y[:, None] + dy
+
+        if boundary == PERIODIC:
+            nx %= width
+            ny %= height
+            inside = np.ones(nx.shape, dtype=bool)
+        elif boundary == BOUNDED:
+            inside = (0 <= nx) & (nx < width) & (0 <= ny) & (ny < height)
+        else:
+            raise ValueError("Unknown boundary mode: {}".format(boundary))
+
+        self.dense = np.where(inside, nx * height + ny, -1)
+        self.valid = inside
+
+        self.indptr = np.concatenate(([0], np.cumsum(np.sum(inside, axis=1))))
+        self.indices = self.dense[inside]
+
+        # Tuples for the per-agent models, filled for visited cells only
+        self.position_cache = {}
+
+    @property
+    def size(self):
+        return len(self.dense)
+
+    def __getitem__(self, cell):
+        return self.indices[self.indptr[cell]:self.indptr[cell + 1]]
+
+    def ravel(self, pos):
+        return pos[0] * self.shape[1] + pos[1]
+
+    def unravel(self, cells):
+        return np.divmod(cells, self.shape[1])
+
+    def positions(self, pos):
+        """ Returns the neighbors of a position as a list of (x, y) tuples """
+        try:
+            return self.position_cache[pos]
+        except KeyError:
+            x, y = self.unravel(self[self.ravel(pos)])
+            positions = list(zip(x.tolist(), y.tolist()))
+            self.position_cache[pos] = positions
+            return positions
+
+def choose(options, u):
+    """
+    Picks one True column per row of the boolean (n, k) `options`, uniformly
+    with the uniform number u[row], -1 if the row has none
+    """
+    count = np.sum(options, axis=1)
+    r = (u * count).astype(np.int64)
+    choice = np.argmax(np.cumsum(options, axis=1) > r[:, None], axis=1)
+    choice[count == 0] = -1
+    return choice
+
+tables = {}
+
+def neighbor_table(shape, boundary = BOUNDED, directions = VON_NEUMANN):
+    """ Returns the shared table for a lattice shape, boundary and stencil """
+    key = (tuple(shape), boundary, tuple(directions))
+    if key not in tables:
+        tables[key] = NeighborTable(*key)
+    return tables[key]
@@ -0,0 +1,59 @@
+import weakref
+import numpy as np
+
+EMPTY = -1
+
+class OccupancyGrid:
+    """
+    Lattice of agent ids, EMPTY (-1) marks a free cell.
+
+    Replaces the list-of-lists lattices: a cell costs four bytes instead
+    of a Python list, and the per-agent loops use the scalar accessors.
+
+    The id arrays are recycled: when a grid is garbage collected (e.g. the
+    GUI resets its world) its array goes back to a pool and the next grid
+    of the same shape reuses it instead of allocating a new one.
+    """
+    pool = {}
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.ids = self.acquire(self.shape)
+        weakref.finalize(self, self.release, self.shape, self.ids)
+
+    @classmethod
+    def acquire(cls, shape):
+        free = cls.pool.get(shape)
+        if free:
+            ids = free.pop()
+            ids.fill(EMPTY)
+            return ids
+        return np.full(shape, EMPTY, dtype=np.int32)
+
+    @classmethod
+    def release(cls, shape, ids):
+        cls.pool.setdefault(shape, []).append(ids)
+
+    def reset(self):
+        self.ids.fill(EMPTY)
+
+    def __getitem__(self, pos):
+        return self.ids[pos]
+
+    def place(self, agent, pos):
+        self.ids[pos] = agent
+
+    def clear(self, pos):
+        self.ids[pos] = EMPTY
+
+    def move(self, pos, new_pos):
+        self.ids[new_pos] = self.ids[pos]
+        self.ids[pos] = EMPTY
+
+    def is_in_bounds(self, pos):
+        x, y = pos
+        x_max, y_max = self.shape
+        return (0 <= x < x_max) and (0 <= y < y_max)
+
+    def is_empty(self, pos):
+        return self.is_in_bounds(pos) and self.ids[pos] == EMPTY
@@ -1,9 +1,32 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.mlab import griddata
+import os, sys
 
-X = np.loadtxt("pred0s.tsv")
-Y = np.loadtxt("water_levels.tsv")
-Z = np.loadtxt("extinction_time.tsv")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir))
+from results import ResultStore
+
+# Mean extinction time of the runs of predator_prey.py over the grid of
+# initial predator fractions and water levels, read from its result store
+# (predator_prey/data/extinction, or the directory given as argument).
+DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data", "extinction")
+ITERATION_COUNT = 5000
+
+directory = sys.argv[1] if len(sys.argv) > 1 else DIRECTORY
+points, times = ResultStore(directory).collect("extinction_time")
+runs = [(point, group) for point, group in zip(points, times) if point.get('iteration_count') == ITERATION_COUNT]
+if not runs:
+    sys.exit("No runs of %d steps in %s" % (ITERATION_COUNT, directory))
+
+pred0s = [point['pred0'] for point, _ in runs]
+water_levels = [point['water_level'] for point, _ in runs]
+extinction_time = [np.mean(group) for _, group in runs]
+
+xi = np.linspace(min(pred0s), max(pred0s))
+yi = np.linspace(min(water_levels), max(water_levels))
+
+X, Y = np.meshgrid(xi, yi)
+Z = griddata(pred0s, water_levels, extinction_time, xi, yi)
 
 plt.figure()
 contours = plt.contour(Y, X, Z)
@@ -1,26 +1,39 @@
 from __future__ import division
 import numpy as np
-import numpy.random
 import matplotlib
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 from mpl_toolkits.mplot3d import Axes3D
-from noise import snoise2
-import random
 from datetime import datetime
+import time
 import os
-import multiprocessing as mp
 import itertools
+import sys
 from matplotlib.mlab import griddata
 
-PREDATOR = "Predator"
-PREY = "Prey"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from agents import AgentTable
+from occupancy import OccupancyGrid, EMPTY
+from neighborhood import neighbor_table, choose, VON_NEUMANN, MOORE
+from terrain import noise_terrain
+from rng import RandomBlock, seed_sequence, get_state, set_state
+import snapshot
+from sweep import Sweep
+from results import ResultStore, seed_label
+from recorder import Recorder
 
-class Agent:
-    def __init__(self, type, pos):
-        self.type = type
-        self.pos = pos
-        self.time_since_last_meal = 0
+PREY = 1
+PREDATOR = 2
+NAMES = {PREDATOR: "Predator", PREY: "Prey"}
+
+# Update modes: the default random sequential rule steps one agent after
+# another, the sublattice rule updates all cells of one colour at once.
+# An agent moves one cell and then eats or gives birth next to its new cell,
+# so its update touches the cells up to two steps away. Cells of one colour
+# are at least five steps apart (see sublattice_colours), so the updates of
+# one colour never touch the same cell and need no conflict resolution.
+RANDOM_SEQUENTIAL = "random-sequential"
+SUBLATTICE = "sublattice"
 
 class PredatorPreyModel:
     initial_prey_count = 200
@@ -30,29 +43,43 @@ class PredatorPreyModel:
     movement_rate = 0.8
     grid_shape = (100, 100)
 
-    def __init__(self, initial_predator_count = 10, water_level = 0.2):
+    def __init__(self, initial_predator_count = 10, water_level = 0.2,
+                 update_mode = RANDOM_SEQUENTIAL, terrain_seed = None, seed = None):
         self.initial_predator_count = initial_predator_count
-        width, height = self.grid_shape
+        self.random = RandomBlock(seed)
+        self.update_mode = update_mode
+        self.water_level = water_level
+        self.terrain_seed = terrain_seed
+        self.t = 0
         self.terrain = self.generate_terrain(water_level=water_level, period=30, 
-                                             fractal_depth=2, randomly=True)
-        self.lattice = [[[] for _ in range(width)] for _ in range(height)]
-        self.agents = []
+                                             fractal_depth=2, randomly=True,
+                                             seed=terrain_seed)
+        self.lattice = OccupancyGrid(self.grid_shape)
+        self.neighbor_table = neighbor_table(self.grid_shape)
+        self.agents = AgentTable()
         [self.create_agent(PREDATOR) for i in range(self.initial_predator_count)]
         [self.create_agent(PREY)     for i in range(self.initial_prey_count)]
+        self.agents.commit()
+        if update_mode != RANDOM_SEQUENTIAL:
+            self.init_sublattices()
 
-    def run(self, animating = False, iteration_count = 10000):
-        
-        population_counts = np.zeros((2, iteration_count), dtype=int)
+    def run(self, animating = False, iteration_count = 10000,
+            checkpoint = None, checkpoint_interval = 1000, recorder = None):
+        """
+        Runs the model and returns the population counts. If `checkpoint`
+        is a filename, the state is saved there every `checkpoint_interval` steps.
+        The counts go through `recorder` (see recorder.py), which can spill
+        them to a file and decimate them for long runs.
+        """
+        if recorder is None:
+            recorder = Recorder((NAMES[PREDATOR], NAMES[PREY]))
         
         def loop(t):
             if animating:
                 self.draw()
             self.step()
-            for agent in self.agents:
-                if agent.type == PREDATOR:
-                    population_counts[0,t] += 1
-                else:
-                    population_counts[1,t] += 1
+            snapshot.checkpoint(self, checkpoint, checkpoint_interval)
+            recorder.record(self.count(PREDATOR), self.count(PREY))
         
         if animating:
             figure = plt.figure()
@@ -69,10 +96,10 @@ class PredatorPreyModel:
             animation = None
             for t in range(iteration_count):
                 loop(t)
-                if np.any(population_counts[:,t] == 0):
-                    return population_counts[:, :t + 1]
+                if self.count(PREDATOR) == 0 or self.count(PREY) == 0:
+                    break
         
-        return population_counts
+        return recorder.data().T
     
     def init_drawing(self):
         # NOTE(Pontus): This rescales the colormap so that zero is in the middle
@@ -88,11 +115,19 @@ class PredatorPreyModel:
         self.prey_plot,     = plt.plot([], [], "g.")
     
     
+    def count(self, type):
+        if self.update_mode != RANDOM_SEQUENTIAL:
+            return self.counts[type]
+        return self.agents.count(type)
+
+    def positions(self, type):
+        if self.update_mode != RANDOM_SEQUENTIAL:
+            return np.argwhere(self.species == type)
+        return self.agents.positions(type)
+
     def draw(self):
-        predator_positions = np.array([agent.pos for agent in self.agents
-                                                 if agent.type == PREDATOR])
-        prey_positions = np.array([agent.pos for agent in self.agents
-                                                 if agent.type == PREY])
+        predator_positions = self.positions(PREDATOR)
+        prey_positions = self.positions(PREY)
         if predator_positions.size:
             self.predator_plot.set_data(predator_positions.T)
         else:
@@ -105,107 +140,285 @@ class PredatorPreyModel:
         plt.draw()
         plt.pause(0.0001)
     
-    def generate_terrain(self, period, water_level = 0, fractal_depth = 2, randomly=False):
+    def generate_terrain(self, period, water_level = 0, fractal_depth = 2, randomly=False,
+                         seed=None):
         """
         Generates a pseudo-random terrain matrix. 
         Values > 0 are land and values < 0 are water.
         `water_level` is a number between -1 and 1, where -1 is all land and 1 is all ocean.
         `period` controls the shape of the landscape.
         If `randomly` is false, the same landscape will be generated every time.
+        If a `seed` is given, the landscape of that seed is loaded from the terrain cache.
         """
         if randomly:
-            start = random.random() * 1e5
+            start = self.random.random() * 1e5
         else:
             start = 0
-        width, height = self.grid_shape
-        terrain_iterator = (snoise2(start + i / period, start + j / period, fractal_depth) 
-                            for i in range(width)
-                            for j in range(height))
-        return np.fromiter(terrain_iterator, float).reshape(self.grid_shape) - water_level
+        return noise_terrain(self.grid_shape, period, fractal_depth, water_level,
+                             seed=seed, start=start)
     
     def create_agent(self, type, near=None):
         if near:
-            pos = random.choice(list(self.neighbors(near)))
+            pos = self.random.choice(list(self.neighbors(near)))
         else:
-            pos = tuple(random.randrange(size) for size in self.grid_shape)
+            pos = tuple(self.random.randrange(size) for size in self.grid_shape)
             
         # NOTE(Pontus): This makes sure that
         # the more crowded it is, the less agents will be born
         if not self.is_safe_position(pos):
             return None
             
-        agent = Agent(type, pos)
         x, y = pos
-        self.lattice[x][y].append(agent)
-        self.agents.append(agent)
+        agent = self.agents.create(type, x, y)
+        self.lattice.place(agent, pos)
         return agent
         
     def remove_agent(self, agent):
-        x, y = agent.pos
-        self.lattice[x][y].remove(agent)
+        self.lattice.clear(self.agents.pos(agent))
         self.agents.remove(agent)
+
+    def move_agent(self, agent, pos):
+        self.lattice.move(self.agents.pos(agent), pos)
+        self.agents.move(agent, pos)
     
     def step(self):
-        for agent in self.agents:
-            agent.time_since_last_meal += 1
+        self.t += 1
+        if self.update_mode != RANDOM_SEQUENTIAL:
+            return self.step_sublattices()
+
+        agents = self.agents
+        live = agents.live()
+        # NOTE: The movement, move target and birth numbers of every agent
+        # are drawn at once, only predators that eat draw extra numbers
+        moves = (self.random.uniforms(len(live)) < self.movement_rate).tolist()
+        choices = self.random.uniforms(len(live)).tolist()
+        births = (self.random.uniforms(len(live)) < self.prey_birth_probability).tolist()
+
+        for agent, move, u, birth in zip(live.tolist(), moves, choices, births):
+            # NOTE: Agents eaten earlier in this step are still in the snapshot
+            if not agents.alive[agent]:
+                continue
+
+            agents.time_since_last_meal[agent] += 1
             # die
-            if agent.time_since_last_meal > self.starvation_time:
+            if agents.time_since_last_meal[agent] > self.starvation_time:
                 self.remove_agent(agent)
                 continue
             
             # move
             # TODO(Pontus): Maybe just remove the movement rate and let the
             # current position be a possible new position?
-            if random.random() < self.movement_rate:
+            pos = agents.pos(agent)
+            if move:
                 new_positions = list(filter(self.is_empty_position,
-                                            self.neighbors(agent.pos)))
+                                            self.neighbors(pos)))
                 if not new_positions:
                     continue
-                new_x, new_y = random.choice(new_positions)
-                self.lattice[new_x][new_y].append(agent)
-                x, y = agent.pos
-                self.lattice[x][y].remove(agent)
-                agent.pos = new_x, new_y
+                pos = new_positions[int(u * len(new_positions))]
+                self.move_agent(agent, pos)
             
-            if agent.type == PREY:
-                prey = agent
-                if self.is_safe_position(agent.pos):
-                    agent.time_since_last_meal = 0
+            if agents.type[agent] == PREY:
+                if self.is_safe_position(pos):
+                    agents.time_since_last_meal[agent] = 0
                 # Reproduce
-                if random.random() < self.prey_birth_probability:
-                    self.create_agent(PREY, near=prey.pos)
+                if birth:
+                    self.create_agent(PREY, near=pos)
             
-            if agent.type == PREDATOR:
-                predator = agent
+            elif agents.type[agent] == PREDATOR:
                 # Eat and reproduce
-                for (x, y) in self.neighbors(predator.pos):
-                    for neighbor in self.lattice[x][y]:
-                        if neighbor.type == PREY:
-                            predator.time_since_last_meal = 0
-                            self.remove_agent(neighbor)
-                            if random.random() < self.predator_birth_rate:
-                                self.create_agent(PREDATOR, near=predator.pos)
+                for neighbor_pos in self.neighbors(pos):
+                    neighbor = self.lattice[neighbor_pos]
+                    if neighbor != EMPTY and agents.type[neighbor] == PREY:
+                        agents.time_since_last_meal[agent] = 0
+                        self.remove_agent(neighbor)
+                        if self.random.random() < self.predator_birth_rate:
+                            self.create_agent(PREDATOR, near=pos)
+
+        agents.commit()
             
+    def init_sublattices(self):
+        """
+        Moves the agents into species and hunger planes and builds the colour
+        classes for the sublattice update. The cells within two steps of the
+        cells of one colour never overlap, so all of them can be updated at once.
+        """
+        self.species = np.full(self.grid_shape, EMPTY, dtype=np.int8)
+        self.hunger = np.zeros(self.grid_shape, dtype=np.int32)
+        live = self.agents.live()
+        x, y = self.agents.x[live], self.agents.y[live]
+        self.species[x, y] = self.agents.type[live]
+        self.hunger[x, y] = self.agents.time_since_last_meal[live]
+        self.agents = None
+        self.lattice = None
+        self.init_colours()
+        self.census()
+
+    def init_colours(self):
+        if self.update_mode != SUBLATTICE:
+            raise ValueError("Unknown update mode: {}".format(self.update_mode))
+        colours = sublattice_colours(self.grid_shape, self.neighbor_table.directions)
+        self.colours = [np.flatnonzero(colours == c) for c in range(colours.max() + 1)]
+
+    def save_state(self, filename):
+        """
+        Writes the terrain (its seed if it has one), the agents or the
+        sublattice planes, the RNG state and the step counter to a .npz snapshot.
+        """
+        fields = dict(
+            update_mode = snapshot.encode(self.update_mode),
+            t = self.t,
+            random = snapshot.encode(get_state(self.random))
+        )
+        if self.terrain_seed is not None:
+            fields.update(terrain_seed = self.terrain_seed, water_level = self.water_level)
+        else:
+            fields.update(terrain = self.terrain)
+
+        if self.update_mode != RANDOM_SEQUENTIAL:
+            fields.update(species = self.species, hunger = self.hunger)
+        else:
+            fields.update(self.agents.state())
+
+        snapshot.save(filename, **fields)
+
+    def load_state(self, filename):
+        """ Replaces the state of the model by a snapshot of save_state """
+        state = snapshot.load(filename)
+
+        self.update_mode = snapshot.decode(state['update_mode'])
+        self.t = int(state['t'])
+        set_state(self.random, snapshot.decode(state['random']))
+
+        if 'terrain_seed' in state:
+            self.terrain_seed = int(state['terrain_seed'])
+            self.water_level = float(state['water_level'])
+            self.terrain = self.generate_terrain(water_level=self.water_level, period=30,
+                                                 fractal_depth=2, seed=self.terrain_seed)
+        else:
+            self.terrain_seed = None
+            self.terrain = state['terrain']
+
+        if self.update_mode != RANDOM_SEQUENTIAL:
+            self.species = state['species']
+            self.hunger = state['hunger']
+            self.agents = None
+            self.lattice = None
+            self.init_colours()
+            self.census()
+        else:
+            self.lattice = OccupancyGrid(self.grid_shape)
+            self.agents = AgentTable.restore(state)
+            for agent in self.agents.live():
+                self.lattice.place(agent, self.agents.pos(agent))
+
+    def census(self):
+        """ Counts the agents of the species plane, which the sublattice update then keeps up to date """
+        self.counts = dict((type, int(np.count_nonzero(self.species == type))) for type in (PREY, PREDATOR))
+
+    def step_sublattices(self):
+        updated = np.zeros(self.species.size, dtype=bool)
+        species = self.species.reshape(-1)
+        for cells in self.colours:
+            cells = cells[(species[cells] != EMPTY) & ~updated[cells]]
+            self.update_cells(cells, updated)
+
+    def update_cells(self, cells, updated):
+        """
+        Applies the rules of step() to all agents on `cells`, which are at
+        least five steps apart, at once
+        """
+        species = self.species.reshape(-1)
+        hunger = self.hunger.reshape(-1)
+
+        # die
+        hunger[cells] += 1
+        starving = hunger[cells] > self.starvation_time
+        for type in (PREY, PREDATOR):
+            self.counts[type] -= np.count_nonzero(species[cells[starving]] == type)
+        species[cells[starving]] = EMPTY
+        hunger[cells[starving]] = 0
+        cells = cells[~starving]
+
+        # move
+        moving = self.random.uniforms(len(cells)) < self.movement_rate
+        neighbors = self.neighbor_table.dense[cells[moving]]
+        free = (neighbors >= 0) & (species[neighbors] == EMPTY)
+        choice = choose(free, self.random.uniforms(len(free)))
+        # NOTE: Agents without any free neighbor skip the rest of the step
+        stuck = np.zeros(len(cells), dtype=bool)
+        stuck[moving] = choice < 0
+        movers = np.flatnonzero(moving)[choice >= 0]
+        sources = cells[movers]
+        targets = neighbors[choice >= 0, choice[choice >= 0]]
+        assert len(np.unique(targets)) == len(targets), "sublattice moves collide"
+        species[targets], hunger[targets] = species[sources], hunger[sources]
+        species[sources], hunger[sources] = EMPTY, 0
+        cells[movers] = targets
+        updated[cells] = True
+        cells = cells[~stuck]
+
+        # NOTE: As in step(), is_safe_position() is never true for the cell of
+        # the prey itself, so preys are not fed and age out.
+
+        # Prey reproduce
+        preys = cells[species[cells] == PREY]
+        preys = preys[self.random.uniforms(len(preys)) < self.prey_birth_probability]
+        self.give_birth(PREY, preys, updated)
+
+        # Eat and reproduce
+        predators = cells[species[cells] == PREDATOR]
+        neighbors = self.neighbor_table.dense[predators]
+        eating = (neighbors >= 0) & (species[neighbors] == PREY)
+        hunters = np.repeat(predators, eating.shape[1])[eating.reshape(-1)]
+        victims = neighbors[eating]
+        assert len(np.unique(victims)) == len(victims), "sublattice predators share a prey"
+        species[victims], hunger[victims] = EMPTY, 0
+        self.counts[PREY] -= len(victims)
+        hunger[hunters] = 0
+        hunters = hunters[self.random.uniforms(len(hunters)) < self.predator_birth_rate]
+        self.give_birth(PREDATOR, hunters, updated)
+
+    def give_birth(self, type, parents, updated):
+        species = self.species.reshape(-1)
+        land = self.terrain.reshape(-1) > 0
+        neighbors = self.neighbor_table.dense[parents]
+        children = neighbors[np.arange(len(parents)), choose(neighbors >= 0, self.random.uniforms(len(parents)))]
+        children = children[land[children] & (species[children] == EMPTY)]
+        # NOTE: Only a predator that ate several preys can pick the same cell
+        # twice, then its first birth takes it and the others fail, as in step()
+        children = children[np.sort(np.unique(children, return_index=True)[1])]
+        species[children] = type
+        self.counts[type] += len(children)
+        self.hunger.reshape(-1)[children] = 0
+        updated[children] = True
+
     def neighbors(self, pos):
-        x, y = pos
-        directions = ((1,0), (-1,0), (0,1), (0,-1))
-        return filter(self.is_in_bounds, 
-                      ( (x + dx, y + dy) for (dx, dy) in directions ))
+        return self.neighbor_table.positions(pos)
     
     def is_safe_position(self, pos):
         is_on_land = (self.terrain[pos] > 0)
         return is_on_land and self.is_empty_position(pos)
     
     def is_empty_position(self, pos):
-        x, y = pos
-        occupied = self.lattice[x][y]
-        return not occupied and self.is_in_bounds(pos)
+        return self.lattice[pos] == EMPTY
     
     def is_in_bounds(self, pos):
         x, y = pos
         x_max, y_max = self.grid_shape
         return (0 <= x < x_max) and (0 <= y < y_max)
 
+def sublattice_colours(shape, directions):
+    """
+    Colours the cells such that cells of one colour are at least five steps
+    of the stencil apart: (x + 5 y) mod 13 for von Neumann, 5 x 5 tiles for Moore
+    """
+    x, y = np.indices(shape)
+    if set(directions) == set(VON_NEUMANN):
+        return (x + 5 * y) % 13
+    if set(directions) == set(MOORE):
+        return x % 5 + 5 * (y % 5)
+    raise ValueError("No sublattice colouring for the stencil {}".format(directions))
+
 def plot_landscape(model, water_level):
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
@@ -223,7 +436,7 @@ def plot_analysis(model, population_counts):
     map_plot.imshow(model.terrain.T < 0, cmap=plt.cm.gray, vmin=-3, vmax=1)
     
     dynamics_plot.plot(population_counts.T)
-    dynamics_plot.legend([PREDATOR, PREY])
+    dynamics_plot.legend([NAMES[PREDATOR], NAMES[PREY]])
     dynamics_plot.set_title("Population dynamics")
     dynamics_plot.set_xlabel(r"Time $t$")
     dynamics_plot.set_ylabel(r"Population size")
@@ -238,8 +451,8 @@ def plot_analysis(model, population_counts):
     population_counts_fft = abs(np.fft.rfft(population_counts))[:,1:] 
     f = np.fft.rfftfreq(population_counts.shape[1])[1:]
     
-    frequency_plot.plot(f, population_counts_fft[0,:], label=PREDATOR)
-    frequency_plot.plot(f, population_counts_fft[1,:], label=PREY)
+    frequency_plot.plot(f, population_counts_fft[0,:], label=NAMES[PREDATOR])
+    frequency_plot.plot(f, population_counts_fft[1,:], label=NAMES[PREY])
     frequency_plot.legend()
     frequency_plot.set_title("Frequency domain")
     frequency_plot.set_xlabel("Frequency")
@@ -248,32 +461,43 @@ def plot_analysis(model, population_counts):
     frequency_plot.set_yscale("log")
     frequency_plot.axis("tight")
 
-#@np.vectorize
-def extinction_plot(pred0, water_level, sample_count = 10, iteration_count=5000):
-    print("pred0:", pred0, "water_level:", water_level)
-    sum = 0
-    for run in range(sample_count):
-        initial_predator_count = int(pred0 / (1 - pred0) * PredatorPreyModel.initial_prey_count)
-        model = PredatorPreyModel(initial_predator_count, water_level)
-        population_counts = model.run(animating=False, iteration_count=iteration_count)
-        final_time = population_counts.shape[1]
-        #extinction = (final_time != iteration_count)
-        #if extinction:
-        #    sum += final_time
-        sum += final_time
-    average = sum / sample_count
-    print(average)
-    return pred0, water_level, average
+# Every extinction run appends its record to this store, see results.py
+RESULTS = "data/extinction"
+
+def extinction_run(point, run, seed):
+    """ Returns the final time of one run at the point (pred0, water_level, iteration_count) """
+    start = time.time()
+    pred0, water_level, iteration_count = point
+    initial_predator_count = int(pred0 / (1 - pred0) * PredatorPreyModel.initial_prey_count)
+    # NOTE: Every sample index has its own landscape, which is generated
+    # once and then shared by all grid points through the terrain cache
+    model = PredatorPreyModel(initial_predator_count, water_level,
+                              terrain_seed=run, seed=seed)
+    population_counts = model.run(animating=False, iteration_count=iteration_count)
+    final_time = population_counts.shape[1]
+
+    ResultStore(RESULTS).append([(
+        dict(pred0=pred0, water_level=water_level, iteration_count=iteration_count),
+        dict(run=run, seed=seed_label(seed), extinction_time=final_time,
+             duration=time.time() - start))])
+    return final_time
     
-def plot_average_extinction_time(sample_count = 10, iteration_count = 10000):
+def plot_average_extinction_time(sample_count = 10, iteration_count = 5000, seed = None):
+    # NOTE: Runs take 5000 steps by default, as the runs behind data50/ did.
+    # All runs derive their streams from one root seed, which is printed so
+    # that a sweep (or any single run of it) can be repeated
+    root = seed_sequence(seed).entropy
+    print("seed:", root)
+
     pred0s = np.linspace(0.01, 0.5, 10)
     water_levels = np.linspace(-1, 0.4, 10)
-    #pred0s, water_levels = np.meshgrid(pred0s, water_levels)
-    #extinction_time = extinction_plot(pred0s, water_levels)
+    points = [(pred0, water_level, iteration_count)
+              for pred0, water_level in itertools.product(pred0s, water_levels)]
 
-    pool = mp.Pool(8)
-    tasks = [pool.apply_async(extinction_plot, args=args) for args in itertools.product(pred0s, water_levels)]
-    pred0s, water_levels, extinction_time = zip(*[t.get() for t in tasks])
+    with Sweep(processes=8) as sweep:
+        final_times = sweep.map(extinction_run, points, sample_count, root)
+    pred0s, water_levels, _ = zip(*points)
+    extinction_time = [np.mean(times) for times in final_times]
 
     xi = np.linspace(min(pred0s), max(pred0s))
     yi = np.linspace(min(water_levels), max(water_levels))
@@ -281,12 +505,6 @@ def plot_average_extinction_time(sample_count = 10, iteration_count = 10000):
     X, Y = np.meshgrid(xi, yi)
     Z = griddata(pred0s, water_levels, extinction_time, xi, yi)
 
-    directory = "data"
-    if not os.path.exists(directory):
-        os.makedirs(directory)
-    np.savetxt(directory + "/pred0s.tsv", X)
-    np.savetxt(directory + "/water_levels.tsv", Y)
-    np.savetxt(directory + "/extinction_time.tsv", Z)
     plt.figure()
     contours = plt.contour(X, Y, Z)
     plt.clabel(contours, inline=1)
@@ -1,15 +1,20 @@
 from __future__ import division
 import numpy as np
-import numpy.random
 import matplotlib.pyplot as plt
-from noise import snoise2
-import random
+import os
+import sys
 
-PREDATOR = "Predator"
-PREY = "Prey"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from agents import AgentTable
+from occupancy import OccupancyGrid, EMPTY
+from neighborhood import neighbor_table
+from terrain import noise_terrain
+from transitions import transition_tables
+from rng import python_random
 
-class Agent:
-    pass
+PREY = 1
+PREDATOR = 2
+NAMES = {PREDATOR: "Predator", PREY: "Prey"}
 
 class PredatorPreyModel:
     initial_predator_count = 50
@@ -23,14 +28,18 @@ class PredatorPreyModel:
     preferred_terrain = {PREDATOR: 0.1, PREY: 0.9}
     grid_shape = (100, 100)
 
-    def __init__(self):
-        width, height = self.grid_shape
+    def __init__(self, seed = None):
+        self.random = python_random(seed)
         self.terrain = self.generate_terrain(water_level=0.2, period=30, 
                                              fractal_depth=2, randomly=True)
-        self.lattice = [[[] for _ in range(width)] for _ in range(height)]
-        self.agents = []
+        self.lattice = OccupancyGrid(self.grid_shape)
+        self.neighbor_table = neighbor_table(self.grid_shape)
+        self.transitions = transition_tables(self.terrain, self.preferred_terrain,
+                                             self.neighbor_table)
+        self.agents = AgentTable()
         [self.create_agent(PREDATOR) for i in range(self.initial_predator_count)]
         [self.create_agent(PREY)     for i in range(self.initial_prey_count)]
+        self.agents.commit()
 
     def run(self, animation = False, iteration_count = 80000):
         population_counts = np.zeros((2, iteration_count), dtype=int)
@@ -38,119 +47,105 @@ class PredatorPreyModel:
             self.step()
             if animation:
                 self.draw()
-            for agent in self.agents:
-                if agent.type == PREDATOR:
-                    population_counts[0,t] += 1
-                else:
-                    population_counts[1,t] += 1
+            population_counts[0,t] = self.agents.count(PREDATOR)
+            population_counts[1,t] = self.agents.count(PREY)
         return population_counts
     
-    def generate_terrain(self, water_level, period, fractal_depth, randomly=False):
+    def generate_terrain(self, water_level, period, fractal_depth, randomly=False, seed=None):
         """
         Generates a pseudo-random terrain matrix. 
         Values > 0 are land and values < 0 are water.
         `water_level` is a number between -1 and 1, where -1 is all land and 1 is all ocean.
         `period` controls the shape of the landscape.
         If `randomly` is false, the same landscape will be generated every time.
+        If a `seed` is given, the landscape of that seed is loaded from the terrain cache.
         """
         if randomly:
-            start = random.random() * 1e5
+            start = self.random.random() * 1e5
         else:
             start = 0
-        width, height = self.grid_shape
-        terrain_iterator = (snoise2(start + i / period, start + j / period, fractal_depth) 
-                            for i in range(width)
-                            for j in range(height))
-        return np.fromiter(terrain_iterator, float).reshape(self.grid_shape) - water_level
+        return noise_terrain(self.grid_shape, period, fractal_depth, water_level,
+                             seed=seed, start=start)
     
     def create_agent(self, type, near=None):
         if near:
-            pos = random.choice(list(self.neighbors(near)))
+            pos = self.random.choice(list(self.neighbors(near)))
         else:
-            pos = tuple(random.randrange(size) for size in self.grid_shape)
+            pos = tuple(self.random.randrange(size) for size in self.grid_shape)
         # NOTE(Pontus): This makes sure that
         # the more crowded it is, the less agents will be born
         if not self.is_safe_position(pos):
             return None
             
-        agent = Agent()
-        agent.type = type
-        agent.preferred_terrain = self.preferred_terrain[type]
-        agent.pos = x, y = pos
-        self.lattice[x][y].append(agent)
-        self.agents.append(agent)
+        x, y = pos
+        agent = self.agents.create(type, x, y)
+        self.lattice.place(agent, pos)
         return agent
         
     def remove_agent(self, agent):
-        x, y = agent.pos
-        self.lattice[x][y].remove(agent)
+        self.lattice.clear(self.agents.pos(agent))
         self.agents.remove(agent)
+
+    def move_agent(self, agent, pos):
+        self.lattice.move(self.agents.pos(agent), pos)
+        self.agents.move(agent, pos)
     
     def step(self):
-        for agent in self.agents:
+        agents = self.agents
+        for agent in agents.live():
+            if not agents.alive[agent]:
+                continue
+
             # move
-            if random.random() < self.movement_rate:
+            pos = agents.pos(agent)
+            if self.random.random() < self.movement_rate:
                 # NOTE(Pontus): This makes them prefer directions 
                 # that lead closer to preferred terrain
-                new_positions = list(filter(self.is_empty_position,
-                                            self.neighbors(agent.pos)))
-                if not new_positions:
+                transitions = self.transitions[agents.type[agent]]
+                new_pos = transitions.choose(pos, self.is_empty_position, self.random.random())
+                if new_pos is None:
                     continue
-                weights = [1 / abs(self.terrain[new_pos] - agent.preferred_terrain)
-                           for new_pos in new_positions]
-                probabilities = np.array(weights) / np.sum(weights)
-                i = np.random.choice(len(new_positions), p=probabilities)
-                new_x, new_y = new_positions[i]
-                self.lattice[new_x][new_y].append(agent)
-                x, y = agent.pos
-                self.lattice[x][y].remove(agent)
-                agent.pos = new_x, new_y
+                pos = new_pos
+                self.move_agent(agent, pos)
             
-            if agent.type == PREY:
-                prey = agent
+            if agents.type[agent] == PREY:
                 # Drown
-                is_in_water = self.terrain[prey.pos] < 0
-                if is_in_water and (random.random() < self.drowning_rate_prey):
-                    self.remove_agent(prey)
+                is_in_water = self.terrain[pos] < 0
+                if is_in_water and (self.random.random() < self.drowning_rate_prey):
+                    self.remove_agent(agent)
                     continue
                 # Reproduce
-                if random.random() < self.prey_birth_probability:
-                    self.create_agent(PREY, near=prey.pos)
+                if self.random.random() < self.prey_birth_probability:
+                    self.create_agent(PREY, near=pos)
             
-            if agent.type == PREDATOR:
-                predator = agent
+            if agents.type[agent] == PREDATOR:
                 # Eat and reproduce
-                for (x, y) in self.neighbors(predator.pos):
-                    for neighbor in self.lattice[x][y]:
-                    	#if neighbor.type == PREY:
-                        if random.random() < self.predator_hungry:
-                            neighbor.type = PREDATOR 
-                           		# NOTE(Pontus): They are vampires ;)
+                for neighbor_pos in self.neighbors(pos):
+                    neighbor = self.lattice[neighbor_pos]
+                    #if agents.type[neighbor] == PREY:
+                    if neighbor != EMPTY and self.random.random() < self.predator_hungry:
+                        agents.set_type(neighbor, PREDATOR)
+                        # NOTE(Pontus): They are vampires ;)
                         
                 # Die
-            if agent.type == PREDATOR:
-				predator = agent
-				is_in_water = self.terrain[predator.pos] < 0
-				if is_in_water and (random.random() < self.drowning_rate_predator):
-				    self.remove_agent(predator)
-				    continue
-				if random.random() < self.predator_death_probability:
-					self.remove_agent(predator)
+                is_in_water = self.terrain[pos] < 0
+                if is_in_water and (self.random.random() < self.drowning_rate_predator):
+                    self.remove_agent(agent)
+                    continue
+                if self.random.random() < self.predator_death_probability:
+                    self.remove_agent(agent)
+
+        agents.commit()
             
     def neighbors(self, pos):
-        x, y = pos
-        directions = ((1,0), (-1,0), (0,1), (0,-1))
-        return filter(self.is_in_bounds, 
-                      ( (x + dx, y + dy) for (dx, dy) in directions ))
+        return self.neighbor_table.positions(pos)
     
     def is_safe_position(self, pos):
         is_on_land = (self.terrain[pos] > 0)
         return is_on_land and self.is_empty_position(pos)
     
     def is_empty_position(self, pos):
-        x, y = pos
-        occupied = self.lattice[x][y]
-        return not occupied and self.is_in_bounds(pos)
+        return self.lattice[pos] == EMPTY
     
     def is_in_bounds(self, pos):
         x, y = pos
@@ -164,15 +159,8 @@ class PredatorPreyModel:
         plt.imshow(self.terrain.T, cmap=plt.cm.coolwarm, 
                    vmin = -terrain_max, vmax = terrain_max)
         
-        # TODO(Pontus): These should not be allocated at each timestep
-        size = (len(self.agents), 2)
-        predator_positions = np.zeros(size, dtype = int)
-        prey_positions     = np.zeros(size, dtype = int)
-        for i, agent in enumerate(self.agents):
-            if agent.type == PREDATOR:
-                predator_positions[i, :] = agent.pos
-            else:
-                prey_positions[i, :]     = agent.pos
+        predator_positions = self.agents.positions(PREDATOR)
+        prey_positions     = self.agents.positions(PREY)
         
         # TODO(Pontus): Improve performance of this plot by not 
         # redrawing the entire thing every time
@@ -196,7 +184,7 @@ if __name__ == '__main__':
     plt.title(map_file)
     plt.plot(counts[0,:])
     plt.plot(counts[1,:])
-    plt.legend([PREDATOR, PREY])
+    plt.legend([NAMES[PREDATOR], NAMES[PREY]])
     
     # Plots over frequency
     plt.subplot(2, 2, 2 + map_index + 1)
@@ -206,6 +194,6 @@ if __name__ == '__main__':
     f = np.fft.rfftfreq(iteration_count)[1:]
     plt.plot(f, counts_fft[0,:])
     plt.plot(f, counts_fft[1,:])
-    plt.legend([PREDATOR, PREY])
+    plt.legend([NAMES[PREDATOR], NAMES[PREY]])
     plt.axis("tight")
     plt.show()
\ No newline at end of file
@@ -0,0 +1,94 @@
+import os
+import tempfile
+import numpy as np
+
+# Population time series with constant memory.
+#
+# A Recorder takes one row of observables per step (e.g. the predator and
+# prey counts, which the models keep as O(1) counters) and writes it into a
+# fixed size buffer of `chunk` rows. Full buffers are appended to a file,
+# `filename` or an anonymous temporary file, and read back as a memory map.
+# So the memory of a run does not grow with its length, and a run that ends
+# early never allocates more than one chunk.
+#
+# With `decimation` k only every k-th row is kept, sample i belongs to step
+# i * k (see times()).
+
+# Rows per buffer
+CHUNK = 4096
+
+class Recorder:
+    def __init__(self, names, filename = None, chunk = CHUNK, decimation = 1, dtype = np.int64):
+        self.names = tuple(names)
+        self.filename = filename
+        self.decimation = decimation
+        self.dtype = np.dtype(dtype)
+
+        self.buffer = np.zeros((chunk, len(self.names)), dtype=self.dtype)
+        self.fill = 0
+        self.spilled = 0
+        self.steps = 0
+        self.file = None
+
+    def __len__(self):
+        """ Number of samples """
+        return self.spilled + self.fill
+
+    def record(self, *values):
+        """ Takes the observables of one step """
+        self.steps += 1
+        if (self.steps - 1) % self.decimation:
+            return
+
+        self.buffer[self.fill] = values
+        self.fill += 1
+        if self.fill == len(self.buffer):
+            self.spill()
+
+    def spill(self):
+        """ Appends the buffered rows to the file """
+        if self.file is None:
+            if self.filename is None:
+                self.file = tempfile.TemporaryFile()
+            else:
+                self.file = open(self.filename, "w+b")
+
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(self.buffer[:self.fill].tobytes())
+        self.file.flush()
+        self.spilled += self.fill
+        self.fill = 0
+
+    def last(self):
+        """ Returns the latest sample, or None if there is none """
+        if self.fill:
+            return self.buffer[self.fill - 1].copy()
+        if self.spilled:
+            return self.stored()[-1].copy()
+        return None
+
+    def stored(self):
+        """ Returns the spilled samples as a read only memory map """
+        if not self.spilled:
+            return np.zeros((0, len(self.names)), dtype=self.dtype)
+        return np.memmap(self.file, dtype=self.dtype, mode="r", shape=(self.spilled, len(self.names)))
+
+    def data(self):
+        """ Returns all samples as an array with one column per observable """
+        return np.concatenate((self.stored(), self.buffer[:self.fill]))
+
+    def series(self, name):
+        """ Returns the samples of one observable """
+        return self.data()[:, self.names.index(name)]
+
+    def times(self):
+        """ Returns the step of every sample """
+        return np.arange(len(self)) * self.decimation
+
+    def close(self):
+        """ Writes the buffered rows to the file and closes it """
+        if self.filename is not None and self.fill:
+            self.spill()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,248 @@
+import cairo
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+# Cairo drawing of the worlds.
+#
+# The WorldRenderer of a world draws through a CairoRenderer, which maps
+# lattice coordinates to pixels. It does not depend on Gtk: the GUI passes
+# the context of its DrawingArea (render), the headless environment the
+# context of an offscreen image surface (draw).
+#
+# A Scene takes the same drawing calls as a CairoRenderer, but only keeps
+# them with copies of their arguments. So a simulation thread can capture
+# what its WorldRenderer draws right after a step, and another thread can
+# draw that frame later without touching the world (see gui.Simulation).
+
+# Number of field images that are kept
+FIELD_CACHE = 8
+
+# From this number of agents on agents() stamps sprites instead of drawing paths
+SPRITES = 2000
+
+def image_surface(width, height):
+    """
+    Returns a transparent ARGB32 surface and the buffer behind it, which has
+    to outlive the surface. ARGB32 pixels are premultiplied, one native
+    endian 32 bit word each, buffer[y, x] is the pixel (x, y).
+    """
+    stride = cairo.ImageSurface.format_stride_for_width(cairo.FORMAT_ARGB32, width)
+    buffer = np.zeros((height, stride // 4), dtype=np.uint32)
+    surface = cairo.ImageSurface.create_for_data(buffer, cairo.FORMAT_ARGB32, width, height, stride)
+    return surface, buffer
+
+def field_surface(field, color):
+    """ Returns an image surface with one pixel per cell of `field` (indexed [x, y]) and its buffer """
+    width, height = field.shape
+    surface, buffer = image_surface(width, height)
+
+    alpha = 1.0 - np.clip(field.T, 0.0, 1.0)
+    channels = [np.rint(255.0 * alpha * c).astype(np.uint32) for c in color[:3]]
+    buffer[:, :width] = np.rint(255.0 * alpha).astype(np.uint32) << 24 | channels[0] << 16 | channels[1] << 8 | channels[2]
+    surface.mark_dirty()
+    return surface, buffer
+
+def disk(radius):
+    """ Pixel offsets (dx, dy) of a disk of `radius` pixels """
+    reach = int(np.ceil(radius))
+    dy, dx = np.mgrid[-reach:reach + 1, -reach:reach + 1]
+    inside = dx * dx + dy * dy <= radius * radius
+    return dx[inside], dy[inside]
+
+def color_groups(count, colors, palette = None):
+    """ Yields (colour, indices) for the agents of every colour, in drawing order """
+    if palette is not None:
+        colors = np.asarray(colors).reshape(-1)
+        for index in np.unique(colors).tolist():
+            yield palette[index], np.flatnonzero(colors == index)
+        return
+
+    colors = np.asarray(colors, dtype=float)
+    if colors.ndim == 1:
+        yield tuple(colors.tolist()), np.arange(count)
+        return
+
+    unique, inverse = np.unique(colors, axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    for group, color in enumerate(unique.tolist()):
+        yield color, np.flatnonzero(inverse == group)
+
+class Scene:
+    """ The drawing calls of a WorldRenderer, replayed on a CairoRenderer by draw() """
+    def __init__(self, worldRenderer = None):
+        self.calls = []
+        if worldRenderer is not None:
+            worldRenderer.render(self)
+
+    def set_size(self, size):
+        self.calls.append(('set_size', (tuple(size),)))
+
+    def agent(self, position, color):
+        self.calls.append(('agent', (tuple(position), tuple(color))))
+
+    def agents(self, positions, colors, palette = None):
+        self.calls.append(('agents', (np.array(positions, dtype=float), np.array(colors), palette)))
+
+    def background(self, filename):
+        self.calls.append(('background', (filename,)))
+
+    def field(self, field, color, cache_id = None):
+        self.calls.append(('field', (np.array(field, dtype=float), tuple(color))))
+
+    def replay(self, renderer):
+        for name, args in self.calls:
+            getattr(renderer, name)(*args)
+
+class CairoRenderer:
+    def __init__(self, worldRenderer):
+        self.size = (100, 100)
+        self.rect = (0, 0)
+        self.worldRenderer = worldRenderer
+        self.sx = 1.0
+        self.sy = 1.0
+        self.ctx = None
+        self.cache = {}
+        self.fields = OrderedDict()
+
+    def agent(self, position, color):
+        self.ctx.set_source_rgb(color[0], color[1], color[2])
+        self.ctx.arc(
+            position[0] * self.sx, 
+            position[1] * self.sy,
+            self.sx, 0, 2 * np.pi
+        )
+        self.ctx.fill()
+
+    def agents(self, positions, colors, palette = None):
+        """
+        Draws many agents at once. `colors` is one colour for all agents,
+        an (n, 3) array of colours, or an array of indices into `palette`.
+        Agents of one colour are drawn as one path, or, from SPRITES agents
+        on, stamped as disks into an image that is painted once.
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        if len(positions) == 0:
+            return
+
+        for color, members in color_groups(len(positions), colors, palette):
+            if len(positions) >= SPRITES:
+                self.stamp(positions[members], color)
+                continue
+
+            self.ctx.set_source_rgb(color[0], color[1], color[2])
+            for x, y in (positions[members] * (self.sx, self.sy)).tolist():
+                self.ctx.move_to(x + self.sx, y)
+                self.ctx.arc(x, y, self.sx, 0, 2 * np.pi)
+            self.ctx.fill()
+
+        if len(positions) >= SPRITES:
+            self.paint_sprites()
+
+    def stamp(self, positions, color):
+        """ Stamps disks of radius sx pixels at the positions into the sprite layer """
+        width, height = int(self.rect[0]), int(self.rect[1])
+        layer = self.cache.get('sprites')
+        if layer is None or layer[1].shape != (height, width):
+            layer = image_surface(width, height)
+            self.cache['sprites'] = layer
+
+        dx, dy = disk(self.sx)
+        x = np.rint(positions[:, 0] * self.sx).astype(np.int64)[:, None] + dx
+        y = np.rint(positions[:, 1] * self.sy).astype(np.int64)[:, None] + dy
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+
+        pixel = 0xff000000 | int(round(255 * color[0])) << 16 | int(round(255 * color[1])) << 8 | int(round(255 * color[2]))
+        layer[1][y[inside], x[inside]] = pixel
+
+    def paint_sprites(self):
+        """ Paints the sprite layer and clears it for the next frame """
+        surface, buffer = self.cache['sprites']
+        surface.mark_dirty()
+        self.ctx.set_source_surface(surface)
+        self.ctx.paint()
+        buffer[:] = 0
+
+    def background(self, filename):
+        try:
+            image = self.cache[filename]
+        except:
+            image = cairo.ImageSurface.create_from_png(filename)
+            self.cache[filename] = image
+        
+        # calculate image size
+        img_height = image.get_height()
+        img_width = image.get_width()
+        width_ratio = float(self.rect[0]) / float(img_width)
+        height_ratio = float(self.rect[1]) / float(img_height)
+        
+        # scale image and add it
+        self.ctx.save()
+        self.ctx.scale(width_ratio, height_ratio)
+        self.ctx.set_source_surface(image)
+        self.ctx.paint()
+        self.ctx.restore()
+
+    def field(self, field, color, cache_id = None):
+        """
+        Draws a field of values in [0, 1] over the lattice, a cell has the
+        colour with opacity 1 - value. The cell image is built as one ARGB32
+        buffer and scaled up without smoothing. Images are cached by their
+        content, `cache_id` is only kept for compatibility.
+        """
+        field = np.asarray(field, dtype=float)
+        key = (hashlib.sha1(np.ascontiguousarray(field).tobytes()).hexdigest(), field.shape, tuple(color))
+
+        try:
+            image = self.fields.pop(key)
+        except KeyError:
+            image = field_surface(field, color)
+            while len(self.fields) >= FIELD_CACHE:
+                self.fields.popitem(last=False)
+        self.fields[key] = image
+
+        self.ctx.save()
+        self.ctx.scale(float(self.rect[0]) / field.shape[0], float(self.rect[1]) / field.shape[1])
+        self.ctx.set_source_surface(image[0])
+        self.ctx.get_source().set_filter(cairo.FILTER_NEAREST)
+        self.ctx.paint()
+        self.ctx.restore()
+
+    def set_size(self, size):
+        self.update_geometry(size, self.rect)
+
+    def update_geometry(self, size, rect, enforce = False):
+        changed = False
+
+        if size[0] != self.size[0] or size[1] != self.size[1]:
+            self.size = size
+            changed = True
+
+        if self.rect[0] != rect[0] or self.rect[1] != rect[1]:
+            self.rect = rect
+            changed = True
+
+        if changed or enforce:
+            self.sx = float(self.rect[0]) / float(self.size[0])
+            self.sy = float(self.rect[1]) / float(self.size[1])
+            self.cache = {}
+
+    def render(self, ctx, rect, scene = None):
+        self.draw(ctx, rect.width, rect.height, scene)
+
+    def draw(self, ctx, width, height, scene = None):
+        """
+        Renders the world, or a Scene captured from it, into a cairo context
+        of width x height pixels
+        """
+        self.update_geometry(self.size, (width, height))
+        self.ctx = ctx
+
+        self.ctx.rectangle(0, 0, self.rect[0], self.rect[1])
+        self.ctx.set_source_rgb(1.0, 1.0, 1.0)
+        self.ctx.fill()
+
+        if scene is None:
+            self.worldRenderer.render(self)
+        else:
+            scene.replay(self)
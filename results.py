@@ -0,0 +1,244 @@
+import os
+import time
+import uuid
+import shutil
+import numbers
+import numpy as np
+import snapshot
+
+# Append-only result store.
+#
+# A store is a directory of .npz segments. Every append() writes one new
+# segment with a unique name (written under a temporary name and renamed,
+# see snapshot.save), so any number of processes can append to the same
+# store at the same time without locks, and no segment is ever modified.
+#
+# A record is a parameter point (dict of numbers) plus named fields, e.g.
+# the seed, the survivor counts `nsum`, the extinction times and the
+# duration of the run. Per segment the parameters are stored as one column
+# per name, scalar fields as columns and array fields as one flat array
+# with row offsets, so records with arrays of different length fit in one
+# segment. Records may have different fields (e.g. imported legacy records
+# without seed and duration), a field that some records lack is padded and
+# masked per segment.
+#
+# The index maps every parameter tuple to its records. It is built from the
+# parameter columns only, the fields of a segment are loaded when a query
+# needs them. Replicas of several sessions at the same point are simply
+# more records of that point, and merge() adds the segments of another
+# store. compact() rewrites many small segments as one.
+
+SUFFIX = ".npz"
+
+def seed_label(seed):
+    """ A string that identifies a seed (integer, SeedSequence or None) """
+    if isinstance(seed, np.random.SeedSequence):
+        return ":".join(str(key) for key in (seed.entropy,) + tuple(seed.spawn_key))
+    return str(seed)
+
+def key(params):
+    """ The index key of a parameter point, its (name, value) pairs sorted by name """
+    return tuple((name, float(params[name])) for name in sorted(params)
+                 if isinstance(params[name], numbers.Real))
+
+def pack(records):
+    """ Returns the arrays of a segment with the records (params, fields) """
+    columns = {}
+    names = sorted(set(name for params, _ in records for name in params))
+    for name in names:
+        columns["param." + name] = np.array([params.get(name, np.nan) for params, _ in records], dtype=float)
+
+    fields = sorted(set(name for _, values in records for name in values))
+    for name in fields:
+        present = [name in values for _, values in records]
+        values = [np.asarray(values[name]) if name in values else None for _, values in records]
+        sample = next(value for value in values if value is not None)
+        scalar = all(value is None or value.ndim == 0 for value in values)
+
+        # NOTE: Records without the field get a placeholder, so that every
+        # column has one entry per record, and are marked in "present."
+        if not all(present):
+            columns["present." + name] = np.array(present)
+            empty = np.zeros((), dtype=sample.dtype) if scalar else np.zeros(0, dtype=sample.dtype)
+            values = [empty if value is None else value for value in values]
+
+        if scalar:
+            columns["field." + name] = np.array(values)
+        else:
+            lengths = [value.size for value in values]
+            columns["field." + name] = np.concatenate([value.reshape(-1) for value in values])
+            columns["offsets." + name] = np.concatenate([[0], np.cumsum(lengths)])
+
+    columns["count"] = np.array(len(records))
+    return columns
+
+def pad(values):
+    """ A query column of field values, None where a record has no such field """
+    given = [value for value in values if value is not None]
+    if any(np.ndim(value) > 0 for value in given):
+        empty = np.zeros(0, dtype=np.asarray(given[0]).dtype)
+        return [empty if value is None else value for value in values]
+    if all(isinstance(value, numbers.Number) for value in given):
+        return np.array([np.nan if value is None else value for value in values])
+    return np.array(values, dtype=object) if len(given) < len(values) else np.array(values)
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(SUFFIX))
+
+class ResultStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = {}
+        self.segments = []
+
+        # NOTE: The index is built on the first query, appending needs none
+        os.makedirs(directory, exist_ok=True)
+
+    def refresh(self):
+        """ Adds the segments that were appended since the last refresh to the index """
+        known = set(self.segments)
+
+        for name in segment_files(self.directory):
+            if name in known:
+                continue
+
+            number = len(self.segments)
+            self.segments.append(name)
+
+            with np.load(os.path.join(self.directory, name)) as data:
+                params = sorted(member[6:] for member in data.files if member.startswith("param."))
+                columns = [data["param." + param] for param in params]
+                count = int(data["count"])
+
+            for row in range(count):
+                point = tuple((param, float(column[row])) for param, column in zip(params, columns)
+                              if not np.isnan(column[row]))
+                self.index.setdefault(point, []).append((number, row))
+
+    def append(self, records):
+        """
+        Appends records, a list of (params, fields) pairs, as one new segment
+        and returns its name. Safe to call from several processes at once.
+        """
+        records = [(dict(key(params)), fields) for params, fields in records]
+        if not records:
+            return None
+
+        name = "%016x-%d-%s%s" % (time.time_ns(), os.getpid(), uuid.uuid4().hex[:8], SUFFIX)
+        snapshot.save(os.path.join(self.directory, name), **pack(records))
+        return name
+
+    def points(self):
+        """ Returns the parameter points of the records, as dicts """
+        self.refresh()
+        return [dict(point) for point in sorted(self.index)]
+
+    def rows(self, params):
+        """ Returns {segment number: rows} of the records whose parameters include `params` """
+        self.refresh()
+        wanted = set(key(params))
+        rows = {}
+        for point, entries in self.index.items():
+            if wanted <= set(point):
+                for number, row in entries:
+                    rows.setdefault(number, []).append(row)
+        return rows
+
+    def read(self, number, rows):
+        """ Returns the params and the fields of rows of a segment, as two lists of dicts """
+        with np.load(os.path.join(self.directory, self.segments[number])) as data:
+            params = [{} for row in rows]
+            fields = [{} for row in rows]
+
+            for member in data.files:
+                if member.startswith("param."):
+                    column = data[member]
+                    for i, row in enumerate(rows):
+                        if not np.isnan(column[row]):
+                            params[i][member[6:]] = float(column[row])
+                elif member.startswith("field."):
+                    name = member[6:]
+                    values = data[member]
+                    offsets = data["offsets." + name] if "offsets." + name in data.files else None
+                    present = data["present." + name] if "present." + name in data.files else None
+                    for i, row in enumerate(rows):
+                        if present is not None and not present[row]:
+                            continue
+                        if offsets is not None:
+                            fields[i][name] = values[offsets[row]:offsets[row + 1]]
+                        else:
+                            fields[i][name] = values[row]
+
+        return params, fields
+
+    def records(self, **params):
+        """ Returns a list of (params, fields) of the records whose parameters include `params` """
+        result = []
+        for number, rows in sorted(self.rows(params).items()):
+            result.extend(zip(*self.read(number, rows)))
+        return result
+
+    def query(self, **params):
+        """
+        Returns the fields of all records whose parameters include `params`,
+        as a dict of field name to array (scalar fields) or list of arrays,
+        with one entry per record. Records without a field get NaN (numbers),
+        None (other scalars) or an empty array there.
+        """
+        records = self.records(**params)
+        names = sorted(set(name for _, fields in records for name in fields))
+        return dict((name, pad([fields.get(name) for _, fields in records])) for name in names)
+
+    def collect(self, field):
+        """
+        Returns the parameter points (dicts) and, per point, the list of the
+        values of `field` of its records. Every segment is read once.
+        """
+        self.refresh()
+        rows = {}
+        for entries in self.index.values():
+            for number, row in entries:
+                rows.setdefault(number, []).append(row)
+
+        values = {}
+        for number in sorted(rows):
+            for row, fields in zip(rows[number], self.read(number, rows[number])[1]):
+                values[number, row] = fields.get(field)
+
+        points = sorted(self.index)
+        return [dict(point) for point in points], [[values[entry] for entry in self.index[point]] for point in points]
+
+    def totals(self, field):
+        """ Returns one dict per parameter point with the sum of `field` over its records """
+        points, values = self.collect(field)
+        return [dict(point, **{field: np.sum(group, axis=0)}) for point, group in zip(points, values)]
+
+    def merge(self, other):
+        """ Adds the segments of the store in directory `other`, hard linked or copied """
+        for name in segment_files(other):
+            source = os.path.join(other, name)
+            target = os.path.join(self.directory, name)
+            if os.path.exists(target):
+                continue
+            try:
+                os.link(source, target)
+            except OSError:
+                temporary = "{}.{}.tmp".format(target, os.getpid())
+                shutil.copyfile(source, temporary)
+                os.rename(temporary, target)
+
+        self.refresh()
+
+    def compact(self):
+        """ Rewrites the segments as one, returns its name. Appends that run meanwhile are kept. """
+        self.refresh()
+        old = list(self.segments)
+        name = self.append(self.records())
+
+        for segment in old:
+            os.remove(os.path.join(self.directory, segment))
+
+        self.index = {}
+        self.segments = []
+        self.refresh()
+        return name
@@ -0,0 +1,139 @@
+import random
+import hashlib
+import numpy as np
+
+# Reproducible random streams.
+#
+# Every World/Model takes a `seed`, which may be None (fresh entropy), an
+# integer, a numpy SeedSequence or an already constructed generator
+# (numpy Generator or random.Random). generator() and python_random() turn
+# it into the numpy or `random` module stream a model draws from.
+#
+# Sweeps derive the seed of every run from one root seed and the address
+# of the run, i.e. its parameter point and replica index:
+#
+#   seed = replica_seed(root, (growth_rate, death_rate), k)
+#
+# The streams of different addresses are statistically independent, and
+# any single run of a sweep can be repeated on its own by constructing its
+# model with the same seed.
+#
+# Hot step loops use a RandomBlock, which draws uniform numbers in large
+# blocks and hands out the numbers of a whole step as one vector.
+
+def seed_sequence(seed = None):
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
+
+def child(seed, *key):
+    """ Returns the child sequence of `seed` at the address `key` (integers) """
+    parent = seed_sequence(seed)
+    return np.random.SeedSequence(parent.entropy, spawn_key=tuple(parent.spawn_key) + key)
+
+def point_key(point):
+    """ Maps a parameter point (number or tuple of numbers) to integer keys """
+    if not isinstance(point, tuple):
+        point = (point,)
+    digest = hashlib.sha1(repr(tuple(float(value) for value in point)).encode("utf-8")).digest()
+    return tuple(int.from_bytes(digest[i:i + 4], "little") for i in range(0, 16, 4))
+
+def replica_seed(root, point, replica):
+    """ Seed of one replica at one parameter point of a sweep """
+    return child(root, *(point_key(point) + (replica,)))
+
+def generator(seed = None):
+    """ Returns a numpy Generator for a seed """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    if isinstance(seed, random.Random):
+        return np.random.default_rng(seed.getrandbits(128))
+    return np.random.default_rng(seed_sequence(seed))
+
+def python_random(seed = None):
+    """ Returns a random.Random instance for a seed """
+    if isinstance(seed, random.Random):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return random.Random(int(seed.integers(2**63)))
+    state = seed_sequence(seed).generate_state(4, np.uint32)
+    return random.Random(int.from_bytes(state.tobytes(), "little"))
+
+# Number of uniform numbers that are drawn at once
+BLOCK_SIZE = 4096
+
+class RandomBlock:
+    """
+    Hands out uniform numbers that are drawn from a numpy Generator in
+    blocks of `size`. Hot loops fetch the numbers of a whole step at once
+    with uniforms(); the scalar methods mirror random.Random.
+    """
+    def __init__(self, seed = None, size = BLOCK_SIZE):
+        self.rng = generator(seed)
+        self.size = size
+        self.refill()
+
+    def refill(self):
+        # NOTE: The state before the block was drawn restores the block
+        self.origin = self.rng.bit_generator.state
+        self.block = self.rng.random(self.size)
+        self.block.flags.writeable = False
+        self.values = self.block.tolist()
+        self.index = 0
+
+    def uniforms(self, count):
+        """ Returns a read-only array of `count` uniform numbers in [0, 1) """
+        if count > self.size:
+            values = self.rng.random(count)
+            self.refill()
+            return values
+        if self.index + count > self.size:
+            self.refill()
+        self.index += count
+        return self.block[self.index - count:self.index]
+
+    def random(self):
+        if self.index == self.size:
+            self.refill()
+        self.index += 1
+        return self.values[self.index - 1]
+
+    def randrange(self, stop):
+        return int(self.random() * stop)
+
+    def choice(self, sequence):
+        return sequence[int(self.random() * len(sequence))]
+
+    def sample(self, population, count):
+        population = list(population)
+        values = [population[i] for i in self.rng.choice(len(population), count, replace=False)]
+        self.refill()
+        return values
+
+    def getstate(self):
+        return dict(origin = self.origin, index = self.index, size = self.size)
+
+    def setstate(self, state):
+        self.rng.bit_generator.state = state['origin']
+        self.size = state['size']
+        self.refill()
+        self.index = state['index']
+
+def get_state(stream):
+    """ Returns the state of a stream as JSON compatible values """
+    if isinstance(stream, RandomBlock):
+        return dict(block = stream.getstate())
+    if isinstance(stream, random.Random):
+        version, internal, gauss = stream.getstate()
+        return dict(random = [version, list(internal), gauss])
+    return dict(generator = stream.bit_generator.state)
+
+def set_state(stream, state):
+    """ Restores a state that was returned by get_state """
+    if 'block' in state:
+        stream.setstate(state['block'])
+    elif 'random' in state:
+        version, internal, gauss = state['random']
+        stream.setstate((version, tuple(internal), gauss))
+    else:
+        stream.bit_generator.state = state['generator']
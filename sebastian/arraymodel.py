@@ -0,0 +1,253 @@
+import numpy as np
+from movetables import move_tables, DIRECTIONS
+from neighborhood import choose
+from rng import generator, get_state, set_state
+import snapshot
+
+# Array engine for the model3 rules.
+#
+# Agents are not stored as objects: the state is two integer count planes
+# (preys, predators) plus the flat cell indices that are derived from them
+# whenever a phase needs per-agent work. Every phase of a step is a handful
+# of whole-array operations, so the cost is dominated by the number of
+# cells rather than by Python overhead per agent.
+#
+# The rules are those of model3.Model:
+#
+#   - Agents move to one of the five cells (stay, right, left, down, up)
+#     of the toroidal lattice that is safe (terrain != 0). They stay within
+#     their region, unless there is no such option or, for predators, a
+#     migration happens with probability migration_rate.
+#   - Preys only move to cells without preys. When several preys pick the
+#     same cell one of them wins at random and the others choose again among
+#     the options that are still free, which mimics the random sequential
+#     order of the reference engine.
+#   - Preys that share a cell with a predator are converted to predators.
+#   - Preys are born on empty land (terrain > 0.5) with growth_rate.
+#   - Predators die with death_rate.
+#
+# The random numbers come from a numpy Generator, see rng.generator for the
+# accepted values of params['seed'].
+#
+# BatchModel holds K independent replicas on the same terrain as a leading
+# axis of the count planes and advances all of them in one step. The rates
+# may be given per replica, and replicas whose predators are extinct are
+# retired, i.e. they are no longer touched by later steps.
+
+class BatchModel:
+	DIRECTIONS = DIRECTIONS
+	RATES = ('migration_rate', 'growth_rate', 'death_rate')
+
+	def __init__(self, params, replicas, retire = True):
+		self.params = params
+		self.replicas = replicas
+		self.retire = retire
+		self.rng = generator(params.get('seed'))
+
+		self.terrain = params['terrain']
+		self.sizex = self.terrain.shape[0]
+		self.sizey = self.terrain.shape[1]
+		self.size = self.sizex * self.sizey
+
+		self.rates = dict(
+			(name, np.broadcast_to(np.asarray(params[name], dtype = float), (replicas,)))
+			for name in self.RATES
+		)
+
+		self.preys = np.zeros((replicas, self.sizex, self.sizey), dtype = np.int32)
+		self.predators = np.zeros((replicas, self.sizex, self.sizey), dtype = np.int32)
+
+		# Views with one row of flat cells per replica
+		self.flat_preys = self.preys.reshape(replicas, self.size)
+		self.flat_predators = self.predators.reshape(replicas, self.size)
+
+		self.t = 0
+		self.extinction_time = np.full(replicas, -1, dtype = np.int64)
+
+		self.build_tables()
+		self.initialize()
+
+		# NOTE: Replicas that start without predators die out at t = 0
+		self.alive = self.counts() > 0
+		self.extinction_time[~self.alive] = self.t
+
+	def reseed(self, seed):
+		""" Continues with the random stream of `seed`, e.g. on a branched copy """
+		self.rng = generator(seed)
+
+	def branch(self, replicas, seed = None, source = 0):
+		"""
+		Returns a BatchModel with `replicas` copies of replica `source` at the
+		current step, drawing from the stream of `seed`. Used to run the
+		burn-in once and the replicas of the survival statistics from there.
+		"""
+		model = BatchModel.__new__(BatchModel)
+		model.__dict__.update(self.__dict__)
+		model.replicas = replicas
+		model.rng = generator(seed)
+
+		model.rates = dict((name, np.repeat(rate[source:source + 1], replicas)) for name, rate in self.rates.items())
+		model.flat_preys = np.repeat(self.flat_preys[source:source + 1], replicas, axis = 0)
+		model.flat_predators = np.repeat(self.flat_predators[source:source + 1], replicas, axis = 0)
+		model.preys = model.flat_preys.reshape(replicas, self.sizex, self.sizey)
+		model.predators = model.flat_predators.reshape(replicas, self.sizex, self.sizey)
+
+		model.extinction_time = np.full(replicas, -1, dtype = np.int64)
+		model.alive = model.counts() > 0
+		model.extinction_time[~model.alive] = self.t
+
+		return model
+
+	def build_tables(self):
+		moves = move_tables(self.terrain)
+
+		self.neighbors = moves.neighbors
+		self.safe_options = moves.safe
+		self.local_options = moves.local
+		self.fertile = self.terrain.reshape(-1) > 0.5
+
+	def counts(self):
+		""" Returns the number of predators of every replica """
+		return np.sum(self.flat_predators, axis = 1)
+
+	def move_predators(self):
+		predators = self.flat_predators.reshape(-1)
+
+		agents = np.repeat(np.arange(len(predators)), predators)
+		if len(agents) == 0: return
+
+		replica, cells = np.divmod(agents, self.size)
+
+		migrate = self.rng.random(len(agents)) < self.rates['migration_rate'][replica]
+		options = np.where(migrate[:, None], self.safe_options[cells], self.local_options[cells])
+
+		choice = choose(options, self.rng.random(len(options)))
+		moving = choice >= 0
+		cells[moving] = self.neighbors[cells[moving], choice[moving]]
+
+		predators[:] = np.bincount(replica * self.size + cells, minlength = len(predators))
+
+	def move_preys(self, rows):
+		preys = self.flat_preys.reshape(-1)
+
+		pending = np.flatnonzero(self.flat_preys[rows])
+		replica, cells = np.divmod(pending, self.size)
+		offset = rows[replica] * self.size
+
+		while len(cells) > 0:
+			targets = self.neighbors[cells] + offset[:, None]
+			options = self.local_options[cells] & (preys[targets] == 0)
+			choice = choose(options, self.rng.random(len(options)))
+
+			keep = choice >= 0
+			cells, offset, targets = cells[keep], offset[keep], targets[keep, choice[keep]]
+			if len(cells) == 0: break
+
+			# One random winner per target cell, the others try again
+			order = self.rng.permutation(len(cells))
+			_, first = np.unique(targets[order], return_index = True)
+			winners = np.zeros(len(cells), dtype = bool)
+			winners[order[first]] = True
+
+			preys[offset[winners] + cells[winners]] = 0
+			preys[targets[winners]] = 1
+			cells, offset = cells[~winners], offset[~winners]
+
+	def step(self):
+		""" Advances all active replicas, returns the predator counts """
+		if self.retire:
+			rows = np.flatnonzero(self.alive)
+		else:
+			rows = np.arange(self.replicas)
+
+		preys = self.flat_preys
+		predators = self.flat_predators
+
+		# Movement
+		self.move_predators()
+		self.move_preys(rows)
+
+		# Predators eat preys
+		eat = (preys > 0) & (predators > 0)
+		predators[eat] += preys[eat]
+		preys[eat] = 0
+
+		# Prey is born
+		growth = self.fertile & (preys[rows] == 0)
+		growth &= self.rng.random((len(rows), self.size)) < self.rates['growth_rate'][rows, None]
+		preys[rows] |= growth
+
+		# Predators die
+		predators[rows] -= self.rng.binomial(predators[rows], self.rates['death_rate'][rows, None])
+
+		self.t += 1
+
+		counts = self.counts()
+		extinct = self.alive & (counts == 0)
+		self.extinction_time[extinct] = self.t
+		self.alive &= ~extinct
+
+		return counts
+
+	def initialize(self):
+		safe = np.flatnonzero(self.terrain.reshape(-1) != 0)
+
+		for k in range(self.replicas):
+			occupy = self.rng.choice(safe, int(len(safe) * self.params['initial_prey']), replace = False)
+			self.flat_preys[k, occupy] += 1
+
+			occupy = self.rng.choice(safe, int(len(safe) * self.params['initial_predator']), replace = False)
+			self.flat_predators[k, occupy] += 1
+
+	def save_state(self, filename):
+		""" Writes terrain, count planes, rates, RNG state and step counter to a .npz snapshot """
+		shape = (self.replicas, self.sizex, self.sizey)
+
+		snapshot.save(filename,
+			terrain = self.terrain,
+			preys = self.flat_preys.reshape(shape),
+			predators = self.flat_predators.reshape(shape),
+			t = self.t,
+			extinction_time = self.extinction_time,
+			alive = self.alive,
+			random = snapshot.encode(get_state(self.rng)),
+			params = snapshot.encode(snapshot.scalars(self.params)),
+			**self.rates
+		)
+
+	def load_state(self, filename):
+		""" Replaces the state of the model by a snapshot of save_state """
+		state = snapshot.load(filename)
+
+		self.params = dict(self.params, terrain = state['terrain'], **snapshot.decode(state['params']))
+		self.terrain = state['terrain']
+		self.sizex, self.sizey = self.terrain.shape
+		self.size = self.sizex * self.sizey
+		self.replicas = len(state['alive'])
+		self.rates = dict((name, state[name]) for name in self.RATES)
+
+		self.preys = state['preys'].astype(np.int32)
+		self.predators = state['predators'].astype(np.int32)
+		self.flat_preys = self.preys.reshape(self.replicas, self.size)
+		self.flat_predators = self.predators.reshape(self.replicas, self.size)
+
+		self.t = int(state['t'])
+		self.extinction_time = state['extinction_time']
+		self.alive = state['alive']
+		set_state(self.rng, snapshot.decode(state['random']))
+
+		self.build_tables()
+
+class Model(BatchModel):
+	""" Single replica with the interface of model3.Model """
+	def __init__(self, params):
+		BatchModel.__init__(self, params, 1, retire = False)
+
+		self.preys = self.preys[0]
+		self.predators = self.predators[0]
+
+	def load_state(self, filename):
+		BatchModel.load_state(self, filename)
+
+		self.preys = self.preys[0]
+		self.predators = self.predators[0]
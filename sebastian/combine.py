@@ -1,26 +1,33 @@
 import pickle
 import numpy as np
-
-with open('output55.dat') as f:
-	data1 = pickle.load(f)
-
-with open('output55.2.dat') as f:
-	data2 = pickle.load(f)
-
-growth_rate = []
-death_rate = []
-nsum = []
-
-for i in range(len(data1)):
-	dataset = data1[i]
-
-	gr = dataset['growth_rate']
-	dr = dataset['death_rate']
-
-	ds = filter(lambda d: d['growth_rate'] == gr, data2)
-	ds = filter(lambda d: d['death_rate'] == dr, ds)
-
-	data1[i]['nsum'] += ds[0]['nsum']
-
-with open('output_combined.dat', 'w+') as f:
-	pickle.dump(data1, f)
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from results import ResultStore
+from survival import from_counts
+
+# Imports the pickled results of older sessions into the result stores.
+# Replicas of the same point from several files just become more records
+# of that point, so there is nothing to merge by hand anymore. The survivor
+# counts become the extinction times of the runs behind them.
+LEGACY = [
+	('output.dat', 'results/map'),
+	('output55.dat', 'results/output55'),
+	('output55.2.dat', 'results/output55'),
+	('output4x55.dat', 'results/output4x55')
+]
+
+for filename, directory in LEGACY:
+	if not os.path.exists(filename):
+		continue
+
+	with open(filename, 'rb') as f:
+		data = pickle.load(f, encoding = 'latin1')
+
+	records = []
+	for dataset in data:
+		point = dict((name, dataset[name]) for name in ('growth_rate', 'death_rate', 'size') if name in dataset)
+		records.append((point, dict(horizon = len(dataset['nsum']), extinction_time = from_counts(dataset['nsum']))))
+
+	ResultStore(directory).append(records)
+	print("%s: %d records -> %s" % (filename, len(records), directory))
@@ -9,16 +9,13 @@
 #include "include/threadpool.hpp"
 #include <boost/thread/mutex.hpp>
 #include <fstream>
+#include <cstdlib>
 
 #define GLFW_INCLUDE_GLU
 #include <GLFW/glfw3.h>
 
 EIGEN_DEFINE_STL_VECTOR_SPECIALIZATION(Eigen::Vector2i)
 
-float frand() {
-	return (float)rand() / (float)RAND_MAX;
-}
-
 struct Agent {
 	enum Type { PREDATOR, PREY } type;
 	Eigen::Vector2i pos;
@@ -37,6 +34,11 @@ struct Params {
 
 	float initialPreyCount;
 	float initialPredatorCount;
+
+	// Every model draws from its own engine, seeded from the root seed
+	// and the address of the run (e.g. parameter indices and replica)
+	unsigned int seed;
+	std::vector<unsigned int> stream;
 };
 
 struct Model {
@@ -51,6 +53,9 @@ struct Model {
 
 	std::vector<int> mIndices;
 
+	std::mt19937 mEngine;
+	std::uniform_real_distribution<float> mUniform;
+
 	Model(Params params) :
 		mParams(params), mTerrain(params.terrain) 
 	{
@@ -70,10 +75,19 @@ struct Model {
 		mPredators = Eigen::MatrixXi::Zero(mSizeX, mSizeY);
 	
 		mTerrain = mParams.terrain;
+
+		std::vector<unsigned int> key(1, params.seed);
+		key.insert(key.end(), params.stream.begin(), params.stream.end());
+		std::seed_seq sequence(key.begin(), key.end());
+		mEngine.seed(sequence);
 	
 		initialize();
 	}
 
+	float frand() {
+		return mUniform(mEngine);
+	}
+
 	int index(const Eigen::Vector2i& pos) {
 		return pos[0] + pos[1] * mSizeX;
 	}
@@ -148,7 +162,7 @@ struct Model {
 			}
 		}
 
-		std::random_shuffle(positions.begin(), positions.end());
+		std::shuffle(positions.begin(), positions.end(), mEngine);
 
 		std::vector<Eigen::Vector2i>::iterator start;
 		std::vector<Eigen::Vector2i>::iterator end;
@@ -233,7 +247,7 @@ struct Model {
 			}
 
 			if (pi != pend) {
-				std::random_shuffle(pi, pend);
+				std::shuffle(pi, pend, mEngine);
 				move(agent, *(positions.begin()));
 			}
 		}
@@ -256,7 +270,7 @@ struct Model {
 			agent->starvationTime = 0;
 
 			if (frand() < mParams.preyBirthRate && pi != pend) {
-				std::random_shuffle(pi, pend);
+				std::shuffle(pi, pend, mEngine);
 				create(*(positions.begin()), Agent::PREY);
 			}
 		} else if (agent->type == Agent::PREDATOR) {
@@ -274,7 +288,7 @@ struct Model {
 	}
 
 	void step() {
-		std::random_shuffle(mIndices.begin(), mIndices.end());
+		std::shuffle(mIndices.begin(), mIndices.end(), mEngine);
 
 		std::vector<int>::iterator it = mIndices.begin();
 		std::vector<int>::iterator iend = mIndices.end();
@@ -379,6 +393,12 @@ struct ModelRenderer {
 	}
 };
 
+unsigned int root_seed(int argc, char* argv[]) {
+	unsigned int seed = argc > 1 ? std::strtoul(argv[1], 0, 10) : std::random_device()();
+	std::cerr << "seed " << seed << std::endl;
+	return seed;
+}
+
 Params create_params() {
 	Params params;
 	int s = 32;
@@ -421,8 +441,8 @@ Params create_params() {
 }
 
 int simulation(int argc, char* argv[]) {
-	srand(time(0));
 	Params params = create_params();
+	params.seed = root_seed(argc, argv);
 
 	Model model(params);
 	ModelRenderer renderer(model);
@@ -460,9 +480,8 @@ int validation(int argc, char* argv[]) {
 	const int K = 100;
 	const int T = 5000;
 
-	srand(time(0));
-
 	Params params;
+	params.seed = root_seed(argc, argv);
 
 	params.migrationRate = 1.0;
 	params.starvationTime = 50;
@@ -488,6 +507,7 @@ int validation(int argc, char* argv[]) {
 	Eigen::ArrayXf alive(5000);
 
 	for (int k = 0; k < K; k++) {
+		params.stream = std::vector<unsigned int>(1, k);
 		Model model(params);
 
 		for (int t = 0; t < T; t++) {
@@ -515,8 +535,8 @@ int measurement(int argc, char* argv[]) {
 	Eigen::ArrayXf initialFractions = Eigen::ArrayXf::LinSpaced(11, 0.00, 0.5);
 	Eigen::ArrayXf migrationRates = Eigen::ArrayXf::LinSpaced(11, 0.0, 1.0);
 
-	srand(time(0));
 	Params params = create_params();
+	params.seed = root_seed(argc, argv);
 
 	boost::threadpool::pool pool(8);
 	boost::mutex mtx;
@@ -531,6 +551,8 @@ int measurement(int argc, char* argv[]) {
 			float totalTime = 0.0;
 
 			for (int k = 0; k < K; k++) {
+				unsigned int address[] = { (unsigned int)i, (unsigned int)j, (unsigned int)k };
+				params.stream = std::vector<unsigned int>(address, address + 3);
 				pool.schedule(std::bind(&worker, params, boost::ref(totalTime), boost::ref(mtx)));
 			}
 
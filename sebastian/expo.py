@@ -1,9 +1,11 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import random, model3
+import random, arraymodel
 import multiprocessing as mp
-import scipy.optimize as opt
-import pickle
+import os
+import snapshot
+from rng import child
+import survival
 
 area = np.ones((5, 5))
 terrain = np.hstack([
@@ -35,39 +37,53 @@ params = dict(
 K = 20
 T = 10000
 
-nsum = np.zeros((T))
+# Steps of the common transient, the K replicas branch off after it
+BURN_IN = 500
+SEED = 0
 
-if True:
-	for k in range(K):
-		model = model3.Model(params)
-		n = np.zeros((T))
-
-		for t in range(T):
-			p = np.sum(model.predators)
-			n[t] = p
-			if p == 0: break
-			model.step()
-			print(k, t)
-
-		nsum += (n > 0) * 1.0
-
-	with open('dump.dat', 'w+') as f:
-		pickle.dump(nsum, f)
+# Transients that are tried before giving up
+ATTEMPTS = 100
 
-#with open('dump.dat') as f:
-#	nsum = pickle.load(f)
+# The run is checkpointed and continues from the checkpoint if there is one,
+# a completed run removes it
+CHECKPOINT = 'expo.npz'
+CHECKPOINT_INTERVAL = 1000
 
+if True:
+	if os.path.exists(CHECKPOINT):
+		model = arraymodel.BatchModel(params, K)
+		model.load_state(CHECKPOINT)
+	else:
+		# The transient runs once, a run that dies out before BURN_IN is repeated
+		for attempt in range(ATTEMPTS):
+			warm = arraymodel.BatchModel(dict(params, seed = child(SEED, attempt, 0)), 1)
+			while warm.t < BURN_IN and warm.alive[0]:
+				warm.step()
+			if warm.alive[0]: break
+		else:
+			raise RuntimeError("All %d transients died out before step %d" % (ATTEMPTS, BURN_IN))
+
+		model = warm.branch(K, seed = child(SEED, attempt, 1))
+
+	while model.t < T and np.any(model.alive):
+		model.step()
+		snapshot.checkpoint(model, CHECKPOINT, CHECKPOINT_INTERVAL)
+		print(model.t)
+
+	if os.path.exists(CHECKPOINT):
+		os.remove(CHECKPOINT)
+
+	extinction_time = model.extinction_time
+	np.save('dump.npy', extinction_time)
+
+#extinction_time = np.load('dump.npy')
+
+# The replicas survived the transient, so p is the survival after BURN_IN
 Tv = np.array(range(T))
-p = nsum / float(K)
-mask = np.where(p > 0.0)
-
-def fitl(l):
-	return np.sum((-l * Tv[mask] - np.log(p[mask]))**2)
-
-
-res = opt.minimize(fitl, 0.0)
-l = res.x
-print('lambda', l)
+times, observed, valid = survival.stack([extinction_time], T)
+p = survival.kaplan_meier(times, observed, valid, T)[0]
+l, low, high = (value[0] for value in survival.bootstrap_rates(times, observed, valid, T, start = BURN_IN, seed = SEED))
+print('lambda', l, '(%f - %f)' % (low, high))
 
 #def fitq(q):
 #	return np.sum((1.0 - (1.0 - np.exp(-l * Tv))**4 - np.exp(-q * Tv))**2)
@@ -78,7 +94,7 @@ print('lambda', l)
 
 plt.figure()
 plt.plot(Tv, p, 'rx')
-plt.plot(Tv, np.exp(-l * Tv), 'k')
+plt.plot(Tv, np.minimum(np.exp(-l * (Tv - BURN_IN)), 1.0), 'k')
 #plt.plot(Tv, np.exp(-0.000124 * Tv), 'k--')
 #plt.plot(Tv, np.exp(-q * Tv), 'k--')
 plt.grid(True)
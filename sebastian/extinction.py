@@ -1,40 +1,40 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import random, model
-import multiprocessing as mp
-
-def measure(Tmax, Nmax, K, params):
-	states = []
-
-	pool = mp.Pool(processes=8)
-	manager = mp.Manager()
-
-	for k in range(K):
-		state = manager.dict(
-			running = True,
-			stop_t = Tmax,
-			stop_n = Nmax,
-			output = 'data/d%f_g%f_k%d.dat' % (params['death_rate'], params['growth_rate'], k),
-			extinct = False,
-			abort = False
-		)
-
-		states.append(state)
-		pool.apply_async(model.track, args=(state,params))
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from sweep import Sweep, TaskState
+from decisions import any_outcome
+
+# Root of the seeds of all runs; every run of a sweep can be repeated on its own
+ROOT_SEED = 0
+
+def track(point, k, seed):
+	state = TaskState(
+		running = True,
+		stop_t = point['stop_t'],
+		stop_n = point['stop_n'],
+		output = 'data/d%f_g%f_k%d.dat' % (point['death_rate'], point['growth_rate'], k),
+		extinct = False,
+		abort = False
+	)
 
-	pool.close()
-	pool.join()
+	model.track(state, dict(point, seed = seed))
+	return state
 
-	extinct = 0
-	abort = 0
+def extinct(state):
+	return state['extinct']
 
-	for state in states:
-		if state['extinct']: extinct += 1
-		if state['abort']: abort += 1
+def measure(sweep, Tmax, Nmax, K, params):
+	point = dict(params, stop_t = Tmax, stop_n = Nmax)
 
-	return extinct, abort
+	# NOTE: The first extinction settles "extinct == 0", the remaining
+	# replicas are cancelled then
+	decision, = sweep.decide(track, [point], K, any_outcome(), extinct, ROOT_SEED)
+	return decision['hits'], decision['total']
 
-def bisect_measure(K, death_rate, growth_rate):
+def bisect_measure(sweep, K, death_rate, growth_rate):
 	Tmax = 1000
 	Nmax = 1200
 
@@ -53,10 +53,11 @@ def bisect_measure(K, death_rate, growth_rate):
 		initial_predator = 0.05
 	)
 
-	return measure(Tmax, Nmax, K, params)
+	return measure(sweep, Tmax, Nmax, K, params)
 
 if __name__ == '__main__':
 	K = 10
+	sweep = Sweep(processes = 8)
 	growths = [0.001, 0.005, 0.01, 0.02, 0.03, 0.05, 0.06, 0.07, 0.1, 0.15, 0.2, 0.4]
 
 	for growth in growths:
@@ -65,19 +66,19 @@ if __name__ == '__main__':
 
 		print("GROWTH: %f" % growth)
 
-		extinct, abort = bisect_measure(K, adeath, growth)
+		extinct, total = bisect_measure(sweep, K, adeath, growth)
 		assert(extinct == 0)
-		print("    Lower bound is OK: %d/%d" % (extinct,abort))
+		print("    Lower bound is OK: %d/%d" % (extinct,total))
 
-		extinct, abort = bisect_measure(K, bdeath, growth)
+		extinct, total = bisect_measure(sweep, K, bdeath, growth)
 		assert(extinct > 0)
-		print("    Upper bound is OK: %d/%d" % (extinct,abort))
+		print("    Upper bound is OK: %d/%d" % (extinct,total))
 
 		while True:
 			cdeath = adeath + (bdeath - adeath) * 0.5
-			extinct, abort = bisect_measure(K, cdeath, growth)
+			extinct, total = bisect_measure(sweep, K, cdeath, growth)
 
-			print("    Value %f gives %d/%d" % (cdeath, extinct, abort))
+			print("    Value %f gives %d/%d" % (cdeath, extinct, total))
 
 			if extinct == 0:
 				adeath = cdeath
@@ -90,3 +91,5 @@ if __name__ == '__main__':
 				break
 
 		print("RESULT FOR %f: %f" % (growth, adeath))
+
+	sweep.close()
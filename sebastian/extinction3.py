@@ -1,65 +1,52 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import random, model3
-import multiprocessing as mp
-
-def measure(Tmax, Nmax, K, params):
-	states = []
-
-	pool = mp.Pool(processes=8)
-	manager = mp.Manager()
-
-	for k in range(K):
-		state = manager.dict(
-			running = True,
-			stop_t = Tmax,
-			stop_n = Nmax,
-			output = 'data/d%f_g%f_k%d.dat' % (params['death_rate'], params['growth_rate'], k),
-			extinct = False,
-			abort = False
-		)
-
-		states.append(state)
-		pool.apply_async(model3.track, args=(state,params))
-
-	pool.close()
-	pool.join()
-
-	extinct = 0
-	abort = 0
-
-	for state in states:
-		if state['extinct']: extinct += 1
-		if state['abort']: abort += 1
-
-	return extinct, abort
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from sweep import Sweep, TaskState
+from threshold import threshold_search
+
+# Root of the seeds of all runs; every run of a sweep can be repeated on its own
+ROOT_SEED = 0
+
+def track(point, k, seed):
+	state = TaskState(
+		running = True,
+		stop_t = point['stop_t'],
+		stop_n = point['stop_n'],
+		extinct = False,
+		abort = False
+	)
 
-def bisect_measure(K, death_rate, growth_rate):
-	Tmax = 1000
-	Nmax = 1200
+	model3.track(state, dict(point, seed = seed))
+	return state
 
-	s = 4
-	#Nmax = 1.1 * s * s
-	terrain = np.ones((s, s)).astype(np.int)
+def extinct(state):
+	return state['extinct']
 
+def parameters(migration_rate):
 	terrain = np.zeros((16, 16))
 	terrain[0:8, 0:8] = 1
 	terrain[0:8, 8:16] = 2
 	terrain[8:16, 0:8] = 3
 	terrain[8:16, 8:16] = 4
 
-	params = dict(
+	return dict(
 		terrain = terrain,
 
-		migration_rate = growth_rate,
+		migration_rate = migration_rate,
 		growth_rate = 0.2,
-		death_rate = death_rate,
 
 		initial_prey = 0.05,
-		initial_predator = 0.05
+		initial_predator = 0.05,
+
+		stop_t = 1000,
+		stop_n = 1200
 	)
 
-	return measure(Tmax, Nmax, K, params)
+def report(search):
+	print("    MIG %f: New Bounds: %f / %f" % (search.point['migration_rate'], search.lower, search.upper))
 
 if __name__ == '__main__':
 	K = 10
@@ -67,42 +54,16 @@ if __name__ == '__main__':
 	growths = [0.0, 0.25, 0.5, 0.75, 1.0]
 	growths = [1.0]
 
-	vals = []
-
-	for growth in growths:
-		#adeath = 0.001
-		#death = 0.5 * growth
-		#bdeath = 0.45
-		adeath = 0.1
-		bdeath = 0.4
-
-		print("MIG: %f" % growth)
-
-		extinct, abort = bisect_measure(K, adeath, growth)
-		assert(extinct == 0)
-		print("    Lower bound is OK: %d/%d" % (extinct,abort))
-
-		extinct, abort = bisect_measure(K, bdeath, growth)
-		assert(extinct > 0)
-		print("    Upper bound is OK: %d/%d" % (extinct,abort))
+	with Sweep(processes = 8) as sweep:
+		results = threshold_search(sweep, track, [parameters(growth) for growth in growths],
+			'death_rate', 0.1, 0.4, K, outcome = extinct, level = 1.0 / K,
+			tolerance = 0.01, seed = ROOT_SEED, report = report)
 
-		while True:
-			cdeath = adeath + (bdeath - adeath) * 0.5
-			extinct, abort = bisect_measure(K, cdeath, growth)
-
-			print("    Value %f gives %d/%d" % (cdeath, extinct, abort))
-
-			if extinct == 0:
-				adeath = cdeath
-			else:
-				bdeath = cdeath
-
-			print("    New Bounds: %f / %f" % (adeath, bdeath))
-
-			if round(adeath, 2) == round(bdeath, 2) and abort == 0:
-				break
+	vals = []
 
-		print("RESULT FOR %f: %f" % (growth, adeath))
-		vals.append(adeath)
+	for result in results:
+		low, high = result['interval']
+		print("RESULT FOR %f: %f (%f - %f)" % (result['point']['migration_rate'], result['critical'], low, high))
+		vals.append(result['critical'])
 
 	print("AVERAGE", np.sum(vals) / 10.0)
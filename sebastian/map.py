@@ -1,12 +1,24 @@
 import numpy as np
 import matplotlib.pyplot as plt
-import random, model3
-import multiprocessing as mp
+import random, arraymodel
 import scipy.optimize as opt
-import pickle
 import time
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from sweep import Sweep, grid
+from results import ResultStore, seed_label
+
+# Root of the seeds of all parameter points
+ROOT_SEED = 0
+
+# Every run appends its record to this store, see results.py
+STORE = 'results/map'
+
+def measure_combination(point, replica, seed):
+	growth_rate = point['growth_rate']
+	death_rate = point['death_rate']
 
-def measure_combination(growth_rate, death_rate):
 	K = 20
 	T = 1000
 	size = 5
@@ -28,58 +40,39 @@ def measure_combination(growth_rate, death_rate):
 		death_rate = death_rate,
 
 		initial_prey = 0.05,
-		initial_predator = 0.05
-	)
-
-	nsum = np.zeros((T))
-
-	for k in range(K):
-		model = model3.Model(params)
-		n = np.zeros((T))
-
-		for t in range(T):
-			p = np.sum(model.predators)
-			n[t] = p
-			if p == 0: break
-			model.step()
+		initial_predator = 0.05,
 
-		nsum += (n > 0) * 1.0
-
-	return dict(
-		nsum = nsum,
-		growth_rate = growth_rate,
-		death_rate = death_rate,
-		size = size
+		# NOTE: The K replicas of a batch share the stream of the point
+		seed = seed
 	)
 
-growths = [0.0, 0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07]
-deaths = [0.0, 0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.1, 0.2]
-
-pool = mp.Pool(8)
-manager = mp.Manager()
-tasks = []
+	start = time.time()
+	model = arraymodel.BatchModel(params, K)
 
-for g in growths:
-	for d in deaths:
-		tasks.append(pool.apply_async(measure_combination, (g, d)))
+	while model.t < T and np.any(model.alive):
+		model.step()
 
-pool.close()
-
-while True:
-	ready = filter(lambda x: x.ready(), tasks)
-	print("%d / %d" % (len(ready), len(tasks)))
-
-	if len(ready) == len(tasks):
-		pool.join()
-		break
+	point = dict(growth_rate = growth_rate, death_rate = death_rate, size = size)
+	# NOTE: One extinction time per replica (-1 if it survived T steps),
+	# the survival curves are computed from them, see survival.py
+	fields = dict(
+		horizon = T,
+		extinction_time = model.extinction_time,
+		seed = seed_label(seed),
+		duration = time.time() - start
+	)
 
-	time.sleep(0.1)
+	ResultStore(STORE).append([(point, fields)])
+	return dict(point, **fields)
 
-data = []
+if __name__ == '__main__':
+	growths = [0.0, 0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07]
+	deaths = [0.0, 0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.1, 0.2]
+	points = grid(growth_rate = growths, death_rate = deaths)
 
-for task in tasks:
-	res = task.get()
-	data.append(res)
+	done = 0
 
-with open('output.dat', 'w+') as f:
-	pickle.dump(data, f)
+	with Sweep(processes = 8) as sweep:
+		for _, _, res in sweep.imap(measure_combination, points, 1, ROOT_SEED):
+			done += 1
+			print("%d / %d" % (done, len(points)))
@@ -1,41 +1,25 @@
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib.mlab import griddata
-import pickle
 import numpy as np
-import scipy.optimize as opt
+import os, sys
 
-with open('output.dat') as f:
-	data = pickle.load(f)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from results import ResultStore
+import survival
 
-x = []
-y = []
-z1 = []
-z2 = []
+# Steps of the runs, see map.py
+HORIZON = 1000
 
-for dataset in data:
-	nsum = dataset['nsum']
-	#p = float(nsum[-1]) / float(nsum[0])
-	p = nsum / float(nsum[0])
-	x.append(dataset['growth_rate'])
-	y.append(dataset['death_rate'])
+points, groups = ResultStore('results/map').collect('extinction_time')
+times, observed, valid = survival.stack([np.concatenate(group) for group in groups], HORIZON)
+curves = survival.survival_curves(times, valid, HORIZON)
+l = survival.decay_rates(curves)
 
-	#if p == 0.0: p = 0.0000001
-
-	#l = - np.log(p) / 1000.0
-
-	Tv = np.array(range(1000))
-	#p = nsum / float(K)
-	mask = np.where(p > 0.0)
-
-	def fitl(l):
-		return np.sum((-l * Tv[mask] - np.log(p[mask]))**2)
-
-	res = opt.minimize(fitl, 0.0)
-	l = res.x[0]
-
-	z1.append(np.exp(-1000.0 * l))
-	z2.append(p[-1])
+x = [point['growth_rate'] for point in points]
+y = [point['death_rate'] for point in points]
+z1 = np.exp(-1000.0 * l)
+z2 = curves[:, -1]
 
 xi = np.linspace(min(x), max(x))
 yi = np.linspace(min(y), max(y))
@@ -1,62 +1,28 @@
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from matplotlib.mlab import griddata
-import pickle
 import numpy as np
-import scipy.optimize as opt
+import os, sys
 
-with open('output4x55.dat') as f:
-	data1 = pickle.load(f)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from results import ResultStore
+import survival
 
-with open('output_combined.dat') as f:
-	data2 = pickle.load(f)
+# Steps of the runs
+HORIZON = 1000
 
-x1 = []
-x2 = []
+def rates(directory):
+	""" Growth rates, death rates and decay rates (per HORIZON steps) of the points of a store """
+	points, groups = ResultStore(directory).collect('extinction_time')
+	times, observed, valid = survival.stack([np.concatenate(group) for group in groups], HORIZON)
+	l = survival.decay_rates(survival.survival_curves(times, valid, HORIZON))
 
-y1 = []
-y2 = []
+	x = [point['growth_rate'] for point in points]
+	y = [point['death_rate'] for point in points]
+	return x, y, 1000.0 * l
 
-z1 = []
-z2 = []
-
-for dataset in data1:
-	nsum = dataset['nsum']
-	p = nsum / float(nsum[0])
-	x1.append(dataset['growth_rate'])
-	y1.append(dataset['death_rate'])
-
-	Tv = np.array(range(1000))
-	mask = np.where(p > 0.0)
-
-	def fitl(l):
-		return np.sum((-l * Tv[mask] - np.log(p[mask]))**2)
-
-	res = opt.minimize(fitl, 0.0)
-	l = res.x[0]
-
-	z1.append(1000.0 * l)
-	#z1.append(np.exp(-1000.0 * l))
-	#z1.append(p[-1])
-
-for dataset in data2:
-	nsum = dataset['nsum']
-	p = nsum / float(nsum[0])
-	x2.append(dataset['growth_rate'])
-	y2.append(dataset['death_rate'])
-
-	Tv = np.array(range(1000))
-	mask = np.where(p > 0.0)
-
-	def fitl(l):
-		return np.sum((-l * Tv[mask] - np.log(p[mask]))**2)
-
-	res = opt.minimize(fitl, 0.0)
-	l = res.x[0]
-
-	z2.append(1000.0 * l)
-	#z2.append(np.exp(-1000.0 * l))
-	#z2.append(p[-1])
+x1, y1, z1 = rates('results/output4x55')
+x2, y2, z2 = rates('results/output55')
 
 xi1 = np.linspace(min(x1), max(x1))
 yi1 = np.linspace(min(y1), max(y1))
@@ -1,56 +1,83 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import random, model
+import os, sys
 
-def measure_k(Nmax, T, K, death_rate, growth_rate):
-	states = []
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from branching import fork_replicas
+from rng import child, point_key
+
+# Root of the seeds of all runs
+ROOT_SEED = 0
+
+# Steps of the common transient, the replicas branch off after it
+BURN_IN = 200
+
+def burn_in(params, steps, seed):
+	""" Runs the transient once, returns the model, its step and its population """
+	warm = model.Model(dict(params, seed = seed))
+	n = np.sum(warm.preys) + np.sum(warm.predators)
+	t = 0
+
+	while t < steps:
+		warm.step()
+		t += 1
+		n = np.sum(warm.preys) + np.sum(warm.predators)
+		if n >= params['stop_n'] or np.sum(warm.predators) == 0:
+			break
+
+	return warm, t, n
 
-	pool = mp.Pool(processes=8)
-	manager = mp.Manager()
+def track(warm, k, params, t0):
+	state = dict(
+		running = True,
+		stop_t = params['stop_t'] - t0,
+		stop_n = params['stop_n'],
+		output = 'data/d%f_g%f_k%d.dat' % (params['death_rate'], params['growth_rate'], k),
+		extinct = False,
+		abort = False
+	)
 
+	model.track(state, params, warm)
+	return state
+
+def measure_k(Nmax, T, K, death_rate, growth_rate):
 	print(growth_rate, death_rate)
 
-	for k in range(K):
-		params = dict(
-			terrain = dict(
-				land = 16 * 16,
-				boxes = 1,
-				distance = 0
-			),
-
-			migration_rate = 0.0,
-			growth_rate = growth_rate,
-			death_rate = death_rate,
-
-			initial_prey = 0.05,
-			initial_predator = 0.05
-		)
-
-		state = manager.dict(
-			running = True,
-			stop_t = T,
-			stop_n = Nmax,
-			output = 'data/d%f_g%f_k%d.dat' % (death_rate, growth_rate, k),
-			extinct = False,
-			abort = False
-		)
-
-		states.append(state)
-		pool.apply_async(model.track, args=(state,params))
-
-		#process = mp.Process(target=model.track, args=(state,params))
-		#process.start()
-		#process.join()
-
-	pool.close()
-	pool.join()
+	params = dict(
+		terrain = dict(
+			land = 16 * 16,
+			boxes = 1,
+			distance = 0
+		),
+
+		migration_rate = 0.0,
+		growth_rate = growth_rate,
+		death_rate = death_rate,
+
+		initial_prey = 0.05,
+		initial_predator = 0.05,
+
+		stop_t = T,
+		stop_n = Nmax
+	)
+
+	# The transient runs once per point, replica k continues from it with child k of the point seed
+	seed = child(ROOT_SEED, *point_key((death_rate, growth_rate)))
+	warm, t0, n = burn_in(params, BURN_IN, seed)
 
 	extinct = 0
 	abort = 0
 
-	for state in states:
-		if state['extinct']: extinct += 1
-		if state['abort']: abort += 1
+	if n >= Nmax:
+		abort = K
+	elif np.sum(warm.predators) == 0:
+		extinct = K
+	else:
+		task = lambda replica_model, k: track(replica_model, k, params, t0)
+		for state in fork_replicas(warm, K, task, seed = seed, processes = 8):
+			if state['extinct']: extinct += 1
+			if state['abort']: abort += 1
 
 	print(extinct, abort)
 	print('')
@@ -84,11 +111,8 @@ def measure_growth(Nmax, T, K):
 			break
 
 if __name__ == '__main__':
-	import multiprocessing as mp
-	manager = mp.Manager()
-
 	K = 10
 	T = 1000
 	Nmax = 1200
 
-	measure_growth(Nmax, T, K)	
+	measure_growth(Nmax, T, K)
@@ -1,14 +1,25 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import random, pickle
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from rng import python_random
+from neighborhood import neighbor_table, with_center, PERIODIC, VON_NEUMANN
 
 class Agent:
 	PREY = 1
 	PREDATOR = 2
 
-	def __init__(self, type, pos):
+	def __init__(self, type, pos, serial = 0):
 		self.pos = pos
 		self.type = type
+		self.serial = serial
+
+	# NOTE: Hashing by the serial number instead of the address makes the
+	# iteration order of the agent sets, and so a seeded run, reproducible
+	def __hash__(self):
+		return self.serial
 
 def check_terrain(size, squares, distance):
 	if size % 2 > 0: return False
@@ -43,10 +54,11 @@ def generate_terrain(land, boxes, distance):
 		return terrain
 
 class Model:
-	DIRECTIONS = ((0,0), (1,0), (-1,0), (0,1), (0,-1))
+	DIRECTIONS = with_center(VON_NEUMANN)
 
 	def __init__(self, params):
 		self.params = params
+		self.random = python_random(params.get('seed'))
 
 		self.terrain = generate_terrain(**params['terrain'])
 		#self.size = params['terrain']['size']
@@ -57,9 +69,15 @@ class Model:
 		self.predators = np.zeros((self.size, self.size))
 
 		self.agents = set()
+		self.serial = 0
+		self.table = neighbor_table((self.size, self.size), PERIODIC, self.DIRECTIONS)
 
 		self.initialize()
 
+	def reseed(self, seed):
+		""" Continues with the random stream of `seed`, e.g. on a branched copy """
+		self.random = python_random(seed)
+
 	def pi(self, pos):
 		return pos[0] + pos[1] * self.size
 
@@ -69,22 +87,8 @@ class Model:
 	def py(self, index):
 		return index / self.size
 
-	def normalize(self, pos):
-		x, y = pos
-
-		if x < self.size: x += self.size
-		if x >= self.size: x -= self.size
-
-		if y < self.size: y += self.size
-		if y >= self.size: y -= self.size
-
-		return x, y
-
 	def neighbors(self, pos):
-		return map(
-			self.normalize, 
-			[(pos[0] + dx, pos[1] + dy) for (dx, dy) in self.DIRECTIONS]
-		)
+		return self.table.positions(pos)
 
 	def all(self):
 		positions = []
@@ -115,7 +119,8 @@ class Model:
 		agent.pos = pos
 
 	def create(self, type, pos):
-		agent = Agent(type, pos)
+		agent = Agent(type, pos, self.serial)
+		self.serial += 1
 		self.agents.add(agent)
 
 		if type == Agent.PREDATOR:
@@ -139,7 +144,7 @@ class Model:
 		for agent in self.agents:
 			options = self.neighbors(agent.pos)
 
-			if agent.type == Agent.PREY or not random.random() < self.params['migration_rate']:
+			if agent.type == Agent.PREY or not self.random.random() < self.params['migration_rate']:
 				filtered_options = list(filter(self.is_safe, options))
 				if len(filtered_options) == 0:
 					filtered_options = options
@@ -150,7 +155,7 @@ class Model:
 				filtered_options = list(filter(self.is_not_prey, filtered_options))
 
 			if len(filtered_options) > 0:
-				pos = random.choice(filtered_options)
+				pos = self.random.choice(filtered_options)
 				self.move(agent, pos)
 
 		# Predators eat preys
@@ -169,7 +174,7 @@ class Model:
 		
 		for i in range(len(growth[0])):
 			pos = growth[0][i], growth[1][i]
-			if random.random() < self.params['growth_rate']:
+			if self.random.random() < self.params['growth_rate']:
 				self.create(Agent.PREY, pos)
 
 		# Predators die
@@ -180,7 +185,7 @@ class Model:
 			removes = []
 
 			for agent in self.lattice[self.pi(pos)]:
-				if agent.type == Agent.PREDATOR and random.random() < self.params['death_rate']:
+				if agent.type == Agent.PREDATOR and self.random.random() < self.params['death_rate']:
 					removes.append(agent)
 
 			for agent in removes:
@@ -189,11 +194,11 @@ class Model:
 	def initialize(self):
 		safe = list(filter(self.is_safe, self.all()))
 
-		occupy = random.sample(safe, int(len(safe) * self.params['initial_prey']))
+		occupy = self.random.sample(safe, int(len(safe) * self.params['initial_prey']))
 		for pos in occupy:
 			self.create(Agent.PREY, pos)
 
-		occupy = random.sample(safe, int(len(safe) * self.params['initial_predator']))
+		occupy = self.random.sample(safe, int(len(safe) * self.params['initial_predator']))
 		for pos in occupy:
 			self.create(Agent.PREDATOR, pos)
 
@@ -236,13 +241,16 @@ class Plotter:
 		plt.draw()
 		plt.pause(0.0001)
 
-def track(state, params):
+def track(state, params, model = None):
+	""" Runs `model` (a new Model of `params` if None) for stop_t more steps """
 	t = 0
 
 	prey = []
 	pred = []
 
-	model = Model(params)
+	if model is None:
+		model = Model(params)
+
 	while state['running'] and t < state['stop_t']:
 		model.step()
 		prey.append(np.sum(model.preys))
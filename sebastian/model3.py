@@ -1,20 +1,38 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import random, pickle
+from collections import OrderedDict
+from movetables import move_tables, DIRECTIONS
+from rng import RandomBlock, get_state, set_state
+import snapshot
+from recorder import Recorder
+
+# Steps between two checkpoints of simulate()
+CHECKPOINT_INTERVAL = 1000
 
 class Agent:
 	PREY = 1
 	PREDATOR = 2
 
-	def __init__(self, type, pos):
+	def __init__(self, type, pos, serial = 0):
 		self.pos = pos
 		self.type = type
+		self.serial = serial
+
+	# NOTE: Hashing by the serial number instead of the address makes the
+	# iteration order of the agent sets, and so a seeded run, reproducible
+	def __hash__(self):
+		return self.serial
+
+def by_serial(agent):
+	return agent.serial
 
 class Model:
-	DIRECTIONS = ((0,0), (1,0), (-1,0), (0,1), (0,-1))
+	DIRECTIONS = DIRECTIONS
 
 	def __init__(self, params):
 		self.params = params
+		self.random = RandomBlock(params.get('seed'))
 
 		self.terrain = params['terrain']
 		self.sizex = self.terrain.shape[0]
@@ -24,10 +42,19 @@ class Model:
 		self.preys = np.zeros((self.sizex, self.sizey))
 		self.predators = np.zeros((self.sizex, self.sizey))
 
-		self.agents = set()
+		# NOTE: Ordered by creation, so a restored snapshot steps the agents in the same order
+		self.agents = OrderedDict()
+		self.serial = 0
+		self.counts = {Agent.PREY: 0, Agent.PREDATOR: 0}
+		self.moves = move_tables(self.terrain)
+		self.t = 0
 
 		self.initialize()
 
+	def reseed(self, seed):
+		""" Continues with the random stream of `seed`, e.g. on a branched copy """
+		self.random = RandomBlock(seed)
+
 	def pi(self, pos):
 		return pos[0] + pos[1] * self.sizex
 
@@ -37,23 +64,6 @@ class Model:
 	def py(self, index):
 		return index / self.sizex
 
-	def normalize(self, pos):
-		x, y = pos
-
-		if x < self.sizex: x += self.sizex
-		if x >= self.sizex: x -= self.sizex
-
-		if y < self.sizey: y += self.sizey
-		if y >= self.sizey: y -= self.sizey
-
-		return x, y
-
-	def neighbors(self, pos):
-		return map(
-			self.normalize, 
-			[(pos[0] + dx, pos[1] + dy) for (dx, dy) in self.DIRECTIONS]
-		)
-
 	def all(self):
 		positions = []
 		for x in range(self.sizex):
@@ -86,8 +96,10 @@ class Model:
 		agent.pos = pos
 
 	def create(self, type, pos):
-		agent = Agent(type, pos)
-		self.agents.add(agent)
+		agent = Agent(type, pos, self.serial)
+		self.serial += 1
+		self.agents[agent] = None
+		self.counts[type] += 1
 
 		if type == Agent.PREDATOR:
 			self.predators[pos] += 1
@@ -103,26 +115,30 @@ class Model:
 			self.preys[agent.pos] -= 1
 
 		self.lattice[self.pi(agent.pos)].remove(agent)
-		self.agents.remove(agent)
+		del self.agents[agent]
+		self.counts[agent.type] -= 1
+
+	def count(self, type):
+		""" Number of agents of a type, kept up to date by create and remove """
+		return self.counts[type]
 
 	def step(self):
-		# Movement
-		for agent in self.agents:
-			options = self.neighbors(agent.pos)
-			options = list(filter(self.is_safe, options))
-
-			if agent.type == Agent.PREY or not random.random() < self.params['migration_rate']:
-				filtered_options = list(filter(self.is_within(self.terrain[agent.pos]), options))
-				if len(filtered_options) == 0:
-					filtered_options = options
+		# Movement, with the random numbers of all agents drawn at once
+		agents = list(self.agents)
+		migrations = (self.random.uniforms(len(agents)) < self.params['migration_rate']).tolist()
+		choices = self.random.uniforms(len(agents)).tolist()
+
+		for agent, migration, u in zip(agents, migrations, choices):
+			if agent.type == Agent.PREY or not migration:
+				filtered_options = self.moves.local_positions[agent.pos]
 			else:
-				filtered_options = options
+				filtered_options = self.moves.safe_positions[agent.pos]
 
 			if agent.type == Agent.PREY:
 				filtered_options = list(filter(self.is_not_prey, filtered_options))
 
 			if len(filtered_options) > 0:
-				pos = random.choice(filtered_options)
+				pos = filtered_options[int(u * len(filtered_options))]
 				self.move(agent, pos)
 
 		# Predators eat preys
@@ -130,7 +146,7 @@ class Model:
 		for i in range(len(eat[0])):
 			pos = eat[0][i], eat[1][i]
 
-			for agent in self.lattice[self.pi(pos)]:
+			for agent in sorted(self.lattice[self.pi(pos)], key = by_serial):
 				if agent.type == Agent.PREY:
 					self.remove(agent)
 					self.create(Agent.PREDATOR, agent.pos)
@@ -138,37 +154,78 @@ class Model:
 		# Prey is born
 		growth = (self.terrain > 0.5) * (self.preys == 0)
 		growth = np.where(growth)
-		
-		for i in range(len(growth[0])):
-			pos = growth[0][i], growth[1][i]
-			if random.random() < self.params['growth_rate']:
-				self.create(Agent.PREY, pos)
+		born = self.random.uniforms(len(growth[0])) < self.params['growth_rate']
+
+		for x, y in zip(growth[0][born].tolist(), growth[1][born].tolist()):
+			self.create(Agent.PREY, (x, y))
 
 		# Predators die
 		deaths = np.where(self.predators > 0)
+		predators = []
 		for i in range(len(deaths[0])):
 			pos = deaths[0][i], deaths[1][i]
 
-			removes = []
-
-			for agent in self.lattice[self.pi(pos)]:
-				if agent.type == Agent.PREDATOR and random.random() < self.params['death_rate']:
-					removes.append(agent)
+			for agent in sorted(self.lattice[self.pi(pos)], key = by_serial):
+				if agent.type == Agent.PREDATOR:
+					predators.append(agent)
 
-			for agent in removes:
+		dies = (self.random.uniforms(len(predators)) < self.params['death_rate']).tolist()
+		for agent, die in zip(predators, dies):
+			if die:
 				self.remove(agent)
 
+		self.t += 1
+
 	def initialize(self):
 		safe = list(filter(self.is_safe, self.all()))
 
-		occupy = random.sample(safe, int(len(safe) * self.params['initial_prey']))
+		occupy = self.random.sample(safe, int(len(safe) * self.params['initial_prey']))
 		for pos in occupy:
 			self.create(Agent.PREY, pos)
 
-		occupy = random.sample(safe, int(len(safe) * self.params['initial_predator']))
+		occupy = self.random.sample(safe, int(len(safe) * self.params['initial_predator']))
 		for pos in occupy:
 			self.create(Agent.PREDATOR, pos)
 
+	def save_state(self, filename):
+		""" Writes terrain, agents, RNG state and step counter to a .npz snapshot """
+		agents = list(self.agents)
+
+		snapshot.save(filename,
+			terrain = self.terrain,
+			type = np.array([agent.type for agent in agents], dtype = np.int8),
+			x = np.array([agent.pos[0] for agent in agents], dtype = np.int32),
+			y = np.array([agent.pos[1] for agent in agents], dtype = np.int32),
+			serial = np.array([agent.serial for agent in agents], dtype = np.int64),
+			next_serial = self.serial,
+			t = self.t,
+			random = snapshot.encode(get_state(self.random)),
+			params = snapshot.encode(snapshot.scalars(self.params))
+		)
+
+	def load_state(self, filename):
+		""" Replaces the state of the model by a snapshot of save_state """
+		state = snapshot.load(filename)
+
+		self.params = dict(self.params, terrain = state['terrain'], **snapshot.decode(state['params']))
+		self.terrain = state['terrain']
+		self.sizex, self.sizey = self.terrain.shape
+		self.moves = move_tables(self.terrain)
+
+		self.lattice = [set() for _ in range(self.sizex * self.sizey)]
+		self.preys = np.zeros((self.sizex, self.sizey))
+		self.predators = np.zeros((self.sizex, self.sizey))
+		self.agents = OrderedDict()
+		self.counts = {Agent.PREY: 0, Agent.PREDATOR: 0}
+
+		for type, x, y, serial in zip(*(state[name].tolist() for name in ('type', 'x', 'y', 'serial'))):
+			self.serial = serial
+			self.create(type, (x, y))
+
+		self.serial = int(state['next_serial'])
+		self.t = int(state['t'])
+		set_state(self.random, snapshot.decode(state['random']))
+
 class Plotter:
 	def __init__(self, model):
 		self.model = model
@@ -182,17 +239,15 @@ class Plotter:
 		self.predator, = plt.plot([], [], 'r.')
 		self.prey, = plt.plot([], [], 'b.')
 
-		self.npred = []
-		self.nprey = []
+		self.counts = Recorder(('predators', 'preys'))
 
 	def track(self):
-		self.npred.append(np.sum(self.model.predators))
-		self.nprey.append(np.sum(self.model.preys))
+		self.counts.record(self.model.count(Agent.PREDATOR), self.model.count(Agent.PREY))
 
 	def plotn(self):
 		plt.figure(2)
-		plt.plot(self.npred, 'r')
-		plt.plot(self.nprey, 'b')
+		plt.plot(self.counts.times(), self.counts.series('predators'), 'r')
+		plt.plot(self.counts.times(), self.counts.series('preys'), 'b')
 		plt.draw()
 		plt.pause(0.0001)
 
@@ -216,9 +271,9 @@ def dieout(state, params):
 		model.step()
 		t += 1
 
-		if np.sum(model.predators) == 0 or t > state['stop_t']:
-			state['extinct'] = np.sum(model.predators) == 0
-			state['endval'] = np.sum(model.predators)
+		if model.count(Agent.PREDATOR) == 0 or t > state['stop_t']:
+			state['extinct'] = model.count(Agent.PREDATOR) == 0
+			state['endval'] = model.count(Agent.PREDATOR)
 			state['endtime'] = t
 			break
 
@@ -231,8 +286,8 @@ def track(state, params):
 	model = Model(params)
 	while state['running'] and t < state['stop_t']:
 		model.step()
-		prey = np.sum(model.preys)
-		pred = np.sum(model.predators)
+		prey = model.count(Agent.PREY)
+		pred = model.count(Agent.PREDATOR)
 		t += 1
 
 		if pred + prey >= state['stop_n'] and t > 1000:
@@ -245,32 +300,43 @@ def track(state, params):
 
 def simulate(state, params):
 	model = Model(params)
+
+	# NOTE: state['resume'] continues from a snapshot, state['checkpoint']
+	# is the snapshot that is written every CHECKPOINT_INTERVAL steps
+	if state.get('resume'):
+		model.load_state(state['resume'])
+
 	plotter = Plotter(model)
 
-	t = 0
+	t = model.t
 
 	while state['running']:
 		t += 1
 
 		model.step()
+		snapshot.checkpoint(model, state.get('checkpoint'), CHECKPOINT_INTERVAL)
 		plotter.track()
 
 		if t % 100 == 0:
 			plotter.plot()
 			plotter.plotn()
 
-		nprey = np.sum(model.preys)
-		npred = np.sum(model.predators)
+		nprey = model.count(Agent.PREY)
+		npred = model.count(Agent.PREDATOR)
 
 		print(nprey, npred, nprey + npred)
 		print(t)
 
+	if state.get('checkpoint'):
+		model.save_state(state['checkpoint'])
+
 if __name__ == '__main__':
 	import multiprocessing as mp
 	manager = mp.Manager()
 
 	state = manager.dict()
 	state['running'] = True
+	state['checkpoint'] = 'model3.npz'
 
 	terrain = np.zeros((8, 8))
 	terrain[0:4, 0:4] = 1
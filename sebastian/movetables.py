@@ -0,0 +1,59 @@
+import numpy as np
+import hashlib
+import os, sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from neighborhood import neighbor_table, with_center, PERIODIC, VON_NEUMANN
+
+# Static move options of the model3 rules.
+#
+# The terrain regions never change during a run, so the options of every
+# cell are computed once per terrain:
+#
+#   safe      all safe neighbors (terrain != 0), used when migrating
+#   same      safe neighbors within the region of the cell
+#   fallback  True where there is no option within the region
+#   local     same, or safe where fallback is set
+#
+# The masks have one column per direction of DIRECTIONS and drive the
+# array engine, the position lists drive the per-agent reference engine.
+
+DIRECTIONS = with_center(VON_NEUMANN)
+
+class MoveTables:
+	def __init__(self, terrain):
+		self.shape = terrain.shape
+		self.neighbors = neighbor_table(terrain.shape, PERIODIC, DIRECTIONS).dense
+
+		flat = terrain.reshape(-1)
+		self.safe = flat[self.neighbors] != 0
+		self.same = self.safe & (flat[self.neighbors] == flat[:, None])
+		self.fallback = ~np.any(self.same, axis = 1)
+		self.local = np.where(self.fallback[:, None], self.safe, self.same)
+
+		self.safe_positions = self.positions(self.safe)
+		self.local_positions = self.positions(self.local)
+
+	def positions(self, options):
+		""" Maps every (x, y) position to the list of its options """
+		x, y = np.divmod(self.neighbors, self.shape[1])
+		result = {}
+
+		for cell in range(len(options)):
+			mask = options[cell]
+			pos = (cell // self.shape[1], cell % self.shape[1])
+			result[pos] = list(zip(x[cell, mask].tolist(), y[cell, mask].tolist()))
+
+		return result
+
+tables = {}
+
+def move_tables(terrain):
+	""" Returns the shared tables of a terrain """
+	terrain = np.ascontiguousarray(terrain)
+	key = (terrain.shape, terrain.dtype.str, hashlib.sha1(terrain.tobytes()).hexdigest())
+
+	if key not in tables:
+		tables[key] = MoveTables(terrain)
+
+	return tables[key]
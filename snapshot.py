@@ -0,0 +1,39 @@
+import os
+import json
+import numpy as np
+
+# Model snapshots.
+#
+# A snapshot is a compressed .npz file of named arrays, written by the
+# save_state() methods of the models and worlds and read back by their
+# load_state(). Values that are not arrays, like RNG states or parameters,
+# are stored as JSON strings (encode/decode). Files are written under a
+# temporary name and renamed, so a crash while writing never replaces the
+# last good snapshot with a broken one.
+
+def encode(value):
+    return np.array(json.dumps(value))
+
+def decode(array):
+    return json.loads(str(array[()]))
+
+def scalars(params):
+    """ The plain number and string entries of a parameter dictionary """
+    return dict((name, value) for name, value in params.items()
+                if isinstance(value, (bool, int, float, str)))
+
+def save(filename, **fields):
+    temporary = "{}.{}.tmp".format(filename, os.getpid())
+    with open(temporary, "wb") as f:
+        np.savez_compressed(f, **fields)
+    os.rename(temporary, filename)
+
+def load(filename):
+    """ Returns the fields of a snapshot as a dictionary of arrays """
+    with np.load(filename) as data:
+        return dict((name, data[name]) for name in data.files)
+
+def checkpoint(model, filename, interval):
+    """ Saves the state of `model` if its step counter is a multiple of `interval` """
+    if filename and interval and model.t % interval == 0:
+        model.save_state(filename)
@@ -0,0 +1,107 @@
+from __future__ import division
+import numpy as np
+from rng import generator
+
+# Survival analysis of extinction times.
+#
+# The runs of a parameter point only report the step at which they died
+# out, -1 if they survived up to the horizon (as BatchModel.extinction_time).
+# stack() pads the runs of many points into (points, replicas) arrays of
+# times, observed flags (False = censored) and a valid mask, and all
+# estimates below work on all points at once:
+#
+#   survival_curves  fraction of runs alive after every step
+#   kaplan_meier     survival estimate that also handles runs censored early
+#   decay_rates      least squares fit of S(t) = exp(-l t), in closed form
+#                    l = -sum(t log S(t)) / sum(t^2) over the steps with S > 0
+#   bootstrap_rates  decay rates with percentile intervals over resampled runs
+
+def stack(groups, horizon, observed = None):
+    """
+    Pads the extinction times of every point (list of 1d arrays, -1 for
+    runs that survived) to (times, observed, valid) arrays of shape
+    (points, replicas). Censored runs get the time `horizon`, or their own
+    time if `observed` (same shape as groups) marks them.
+    """
+    replicas = max(len(group) for group in groups)
+    times = np.full((len(groups), replicas), horizon, dtype=np.int64)
+    events = np.zeros((len(groups), replicas), dtype=bool)
+    valid = np.zeros((len(groups), replicas), dtype=bool)
+
+    for p, group in enumerate(groups):
+        group = np.asarray(group, dtype=np.int64)
+        seen = group >= 0 if observed is None else np.asarray(observed[p], dtype=bool)
+        times[p, :len(group)] = np.where(seen | (group >= 0), group, horizon)
+        events[p, :len(group)] = seen
+        valid[p, :len(group)] = True
+
+    return np.minimum(times, horizon), events & (times <= horizon), valid
+
+def from_counts(nsum):
+    """ Extinction times (-1 = survived) of the runs behind a survivor count series """
+    nsum = np.asarray(nsum, dtype=np.int64)
+    deaths = -np.diff(nsum)
+    times = np.repeat(np.arange(1, len(nsum)), np.maximum(deaths, 0))
+    return np.concatenate((times, np.full(nsum[-1], -1, dtype=np.int64)))
+
+def tables(times, observed, valid, horizon):
+    """ Returns the events and the censored runs per point and step, as (points, horizon + 1) arrays """
+    points = len(times)
+    flat = np.arange(points)[:, None] * (horizon + 1) + times
+    size = points * (horizon + 1)
+    events = np.bincount(flat[valid & observed], minlength=size).reshape(points, horizon + 1)
+    censored = np.bincount(flat[valid & ~observed], minlength=size).reshape(points, horizon + 1)
+    return events, censored
+
+def survival_curves(times, valid, horizon):
+    """ Fraction of the runs of every point that are alive after step t, t < horizon """
+    observed = np.ones(times.shape, dtype=bool)
+    events, censored = tables(times, observed, valid, horizon)
+    total = np.sum(valid, axis=1)[:, None]
+    alive = total - np.cumsum(events, axis=1)
+    return (alive / np.maximum(total, 1))[:, :horizon]
+
+def kaplan_meier(times, observed, valid, horizon):
+    """ Kaplan-Meier estimate of P(T > t) of every point, t < horizon """
+    events, censored = tables(times, observed, valid, horizon)
+    total = np.sum(valid, axis=1)[:, None]
+    leaving = np.cumsum(events + censored, axis=1)
+    at_risk = total - np.hstack((np.zeros((len(times), 1), dtype=leaving.dtype), leaving[:, :-1]))
+
+    hazard = np.where(at_risk > 0, events / np.maximum(at_risk, 1), 0.0)
+    return np.cumprod(1 - hazard, axis=1)[:, :horizon]
+
+def decay_rates(curves, start = 0):
+    """
+    Fits S(t) = exp(-l (t - start)) to the survival curves of every point
+    for t >= start and returns l, NaN where no step has S > 0.
+    """
+    t = np.arange(curves.shape[1]) - start
+    used = (curves > 0) & (t >= 0)
+    logs = np.log(np.where(used, curves, 1.0))
+
+    numerator = -np.sum(np.where(used, t * logs, 0.0), axis=1)
+    denominator = np.sum(np.where(used, t * t, 0), axis=1)
+    return np.where(denominator > 0, numerator / np.maximum(denominator, 1), np.nan)
+
+def bootstrap_rates(times, observed, valid, horizon, samples = 200, confidence = 0.95,
+                    start = 0, seed = None):
+    """
+    Returns the decay rate of every point and the percentile interval
+    (low, high) of the rates of `samples` bootstrap resamples of its runs.
+    """
+    rng = generator(seed)
+    rates = decay_rates(kaplan_meier(times, observed, valid, horizon), start)
+
+    # NOTE: stack() puts the valid runs of every point first
+    counts = np.sum(valid, axis=1)[:, None]
+    resampled = np.empty((samples, len(times)))
+    for s in range(samples):
+        index = (rng.random(times.shape) * counts).astype(np.int64)
+        curves = kaplan_meier(np.take_along_axis(times, index, axis=1),
+                              np.take_along_axis(observed, index, axis=1), valid, horizon)
+        resampled[s] = decay_rates(curves, start)
+
+    tail = 50 * (1 - confidence)
+    low, high = np.nanpercentile(resampled, [tail, 100 - tail], axis=0)
+    return rates, low, high
@@ -0,0 +1,193 @@
+import itertools
+import numbers
+import multiprocessing as mp
+from rng import seed_sequence, replica_seed
+
+# Parallel parameter sweeps.
+#
+# A sweep calls `task(point, replica, seed)` for every point of a parameter
+# grid and every replica index and yields the results as they come in. The
+# seed of every call is derived from the root seed of the sweep and the
+# address (point, replica), see rng.py.
+#
+# A Sweep keeps one pool of worker processes for its whole lifetime, so
+# loops that submit many small sweeps (e.g. a bisection) do not start a pool
+# in every iteration. Calls are shipped in chunks of about equal estimated
+# cost, a few per worker, which keeps the IPC overhead of short tasks low
+# while long tasks are still balanced over the workers. `task` has to be a
+# module level function, so that it can be sent to the workers.
+#
+# The calls of a point can be cancelled while the sweep runs, e.g. once a
+# decision rule (see decisions.py) has settled the verdict of the point.
+# Every point gets a slot in a byte array that is shared with the workers.
+# Workers skip queued calls of cancelled points, and running tasks can poll
+# cancelled() (or use a TaskState) to stop early. Calls are queued replica
+# by replica (first replica of every point, then the second, ...), so a
+# chunk mixes many points and the later replicas of a point are still
+# queued when its first results come back.
+
+# Number of chunks per worker process
+CHUNKS_PER_PROCESS = 4
+
+# Number of points per run that can be cancelled
+SLOTS = 4096
+
+# Cancel flags of the worker (shared with the Sweep) and the running slot
+flags = None
+current = -1
+
+def share_flags(shared):
+    global flags
+    flags = shared
+
+def cancelled():
+    """ True if the call that is running in this process has been cancelled """
+    return flags is not None and current >= 0 and flags[current] != 0
+
+class TaskState(dict):
+    """
+    State dictionary of the model runners (model3.track etc.), whose
+    'running' entry turns False when the running call is cancelled.
+    """
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if key == 'running':
+            return value and not cancelled()
+        return value
+
+def grid(**axes):
+    """ Returns all combinations of the `axes` value lists as dictionaries """
+    names = sorted(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+def point_address(point):
+    """ The numbers that identify a point (number, tuple or dict) for seeding """
+    if isinstance(point, dict):
+        point = tuple(point[name] for name in sorted(point))
+    if not isinstance(point, tuple):
+        point = (point,)
+    return tuple(value for value in point if isinstance(value, numbers.Real))
+
+def run_chunk(args):
+    """ Returns (index, done, result) of the calls, done is False if cancelled """
+    global current
+    task, calls = args
+    results = []
+
+    for index, point, replica, seed, slot in calls:
+        current = slot
+        if cancelled():
+            results.append((index, False, None))
+            continue
+        result = task(point, replica, seed)
+        results.append((index, not cancelled(), result))
+
+    current = -1
+    return results
+
+def chunks(calls, costs, count):
+    """ Splits `calls` into about `count` consecutive chunks of equal cost """
+    target = sum(costs) / float(max(count, 1))
+    chunk, total = [], 0.0
+
+    for call, cost in zip(calls, costs):
+        chunk.append(call)
+        total += cost
+        if total >= target:
+            yield chunk
+            chunk, total = [], 0.0
+
+    if chunk:
+        yield chunk
+
+class Sweep:
+    def __init__(self, processes = None):
+        self.processes = processes or mp.cpu_count()
+        self.pool = None
+        self.flags = mp.RawArray('b', SLOTS)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def run(self, task, points, replicas, seed, cost, cancel = None):
+        """
+        Yields (point index, replica, result) in the order of completion.
+        If `cancel(p, replica, result)` returns True, the queued calls of
+        point p are cancelled. Calls that completed anyway are still
+        yielded, but `cancel` is not consulted for them anymore.
+        """
+        root = seed_sequence(seed)
+        calls = [(index, points[p], replica, replica_seed(root, point_address(points[p]), replica),
+                  p if p < SLOTS else -1)
+                 for index, (replica, p) in enumerate(itertools.product(range(replicas), range(len(points))))]
+        costs = [cost(points[index % len(points)]) if cost else 1.0 for index in range(len(calls))]
+        self.flags[:min(len(points), SLOTS)] = [0] * min(len(points), SLOTS)
+
+        if self.processes == 1 or mp.current_process().daemon:
+            share_flags(self.flags)
+            results = (run_chunk((task, [call])) for call in calls)
+        else:
+            if self.pool is None:
+                self.pool = mp.Pool(self.processes, share_flags, (self.flags,))
+            work = [(task, chunk) for chunk in chunks(calls, costs, self.processes * CHUNKS_PER_PROCESS)]
+            results = self.pool.imap_unordered(run_chunk, work)
+
+        for chunk in results:
+            for index, done, result in chunk:
+                if not done:
+                    continue
+                p, replica = index % len(points), index // len(points)
+                settled = p < SLOTS and self.flags[p]
+                yield p, replica, result
+                if cancel and not settled and cancel(p, replica, result) and p < SLOTS:
+                    self.flags[p] = 1
+
+    def imap(self, task, points, replicas = 1, seed = None, cost = None):
+        """
+        Runs the sweep and yields (point, replica, result) in the order of
+        completion. `cost(point)` estimates the relative cost of one call.
+        """
+        points = list(points)
+        for p, replica, result in self.run(task, points, replicas, seed, cost):
+            yield points[p], replica, result
+
+    def map(self, task, points, replicas = 1, seed = None, cost = None):
+        """ Runs the sweep and returns the results as results[point][replica] """
+        points = list(points)
+        results = [[None] * replicas for _ in points]
+        for p, replica, result in self.run(task, points, replicas, seed, cost):
+            results[p][replica] = result
+        return results
+
+    def decide(self, task, points, replicas, rule, outcome = bool, seed = None, cost = None):
+        """
+        Runs the replicas of every point until `rule` settles its verdict
+        and returns dict(verdict, hits, total) per point, where total counts
+        all replicas that ran to completion, also those that finished after
+        the verdict. Without a rule all replicas run and the verdict is None.
+        """
+        points = list(points)
+        counts = [[0, 0] for _ in points]
+        verdicts = [None] * len(points)
+
+        def settle(p, replica, result):
+            counts[p][0] += int(bool(outcome(result)))
+            counts[p][1] += 1
+            if rule is not None and verdicts[p] is None:
+                verdicts[p] = rule.decide(counts[p][0], counts[p][1], replicas)
+            return verdicts[p] is not None
+
+        for _ in self.run(task, points, replicas, seed, cost, settle):
+            pass
+
+        return [dict(verdict = verdict, hits = hits, total = total)
+                for verdict, (hits, total) in zip(verdicts, counts)]
@@ -0,0 +1,92 @@
+from __future__ import division
+import os
+import random
+import multiprocessing as mp
+import numpy as np
+from noise import snoise2
+
+# Noise terrain generation.
+#
+# A noise field only depends on (seed, period, fractal_depth, shape). Fields
+# for a seed are generated once, stored as .npy files in CACHE_DIRECTORY and
+# loaded memory mapped afterwards, so every process that asks for the same
+# field shares one page-cache copy. The water level is only an offset, so
+# all water levels of a field are derived from the same cached base field.
+
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+
+# Number of lattice rows that are evaluated per block
+BLOCK_ROWS = 64
+
+noise_ufunc = np.frompyfunc(snoise2, 3, 1)
+
+def noise_block(args):
+    """ Evaluates the rows [first, last) of a noise field """
+    first, last, height, start, period, fractal_depth = args
+    i, j = np.meshgrid(np.arange(first, last), np.arange(height), indexing="ij")
+    block = noise_ufunc(start + i / period, start + j / period, fractal_depth)
+    return block.astype(float)
+
+def noise_field(shape, period, fractal_depth = 2, start = 0, processes = None):
+    """
+    Generates a simplex noise field in blocks of rows. With `processes` > 1
+    the blocks are distributed over a pool of worker processes, which is
+    worthwhile for large maps. Inside of pool workers it falls back to
+    a serial evaluation, since those cannot start processes of their own.
+    """
+    width, height = shape
+    blocks = [(first, min(first + BLOCK_ROWS, width), height, start, period, fractal_depth)
+              for first in range(0, width, BLOCK_ROWS)]
+
+    if processes and processes > 1 and not mp.current_process().daemon:
+        pool = mp.Pool(processes)
+        try:
+            rows = pool.map(noise_block, blocks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        rows = [noise_block(block) for block in blocks]
+
+    return np.concatenate(rows, axis=0)
+
+def seed_start(seed):
+    """ Maps a terrain seed to an offset into the noise plane """
+    return random.Random(seed).random() * 1e5
+
+def cache_filename(seed, period, fractal_depth, shape, cache_directory = None):
+    name = "noise_s{}_p{}_d{}_{}x{}.npy".format(seed, period, fractal_depth, *shape)
+    return os.path.join(cache_directory or CACHE_DIRECTORY, name)
+
+def base_field(seed, period, fractal_depth, shape, cache_directory = None, processes = None):
+    """ Returns the memory mapped noise field of a seed, generating it once """
+    filename = cache_filename(seed, period, fractal_depth, shape, cache_directory)
+
+    if not os.path.exists(filename):
+        field = noise_field(shape, period, fractal_depth, seed_start(seed), processes)
+
+        directory = os.path.dirname(filename)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # NOTE: Written under a temporary name and renamed, so concurrent
+        # workers never load a partially written file
+        temporary = "{}.{}.tmp".format(filename, os.getpid())
+        with open(temporary, "wb") as f:
+            np.save(f, field)
+        os.rename(temporary, filename)
+
+    return np.load(filename, mmap_mode="r")
+
+def noise_terrain(shape, period, fractal_depth = 2, water_level = 0, seed = None,
+                  start = 0, cache_directory = None, processes = None):
+    """
+    Returns a terrain matrix where values > 0 are land and values < 0 are water.
+    With a `seed` the noise field comes from the cache, otherwise it is
+    generated at the offset `start` without caching.
+    """
+    if seed is not None:
+        field = base_field(seed, period, fractal_depth, tuple(shape), cache_directory, processes)
+    else:
+        field = noise_field(shape, period, fractal_depth, start, processes)
+    return field - water_level
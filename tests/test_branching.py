@@ -0,0 +1,45 @@
+import os
+import sys
+import numpy as np
+from rng import child
+from branching import clone, fork_replicas
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "sebastian"))
+from arraymodel import BatchModel
+from tests.test_snapshot import params, run
+
+def survival(model, replica):
+    """ Predator counts of 20 steps """
+    return run(model, 20)
+
+def warm(seed = 1):
+    model = BatchModel(dict(params(seed), death_rate = [0.05, 0.3]), 2)
+    run(model, 5)
+    return model
+
+def test_branch_copies_source():
+    model = warm()
+    branch = model.branch(4, seed = 3, source = 1)
+    assert branch.t == model.t
+    assert np.all(branch.preys == model.preys[1])
+    assert np.all(branch.rates['death_rate'] == 0.3)
+
+def test_branch_repeats():
+    model = warm()
+    first = run(model.branch(4, seed = 3), 20)
+    assert run(model.branch(4, seed = 3), 20) == first
+    assert run(model.branch(4, seed = 4), 20) != first
+
+def test_branch_starts_extinct_replicas_at_current_step():
+    model = BatchModel(dict(params(1), initial_predator = 0), 2)
+    assert model.extinction_time.tolist() == [0, 0]
+    run(model, 3)
+    assert model.extinction_time.tolist() == [0, 0]
+    assert model.branch(2, seed = 1).extinction_time.tolist() == [3, 3]
+
+def test_fork_replicas_matches_serial():
+    model = warm()
+    serial = fork_replicas(model, 3, survival, seed = 5, processes = 1)
+    assert fork_replicas(model, 3, survival, seed = 5, processes = 2) == serial
+    assert serial[2] == survival(clone(model, child(5, 2)), 2)
+    assert serial[0] != serial[1]
@@ -0,0 +1,52 @@
+import os
+import numpy as np
+from results import ResultStore
+
+LEGACY = dict(horizon = 100, extinction_time = np.array([3, 7, -1]))
+CURRENT = dict(horizon = 100, extinction_time = np.array([5]), seed = "1:0:2", duration = 0.5)
+
+def test_append_and_query(tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.append([(dict(growth_rate = 0.1, death_rate = 0.2), CURRENT)])
+    store.append([(dict(growth_rate = 0.1, death_rate = 0.2), CURRENT),
+                  (dict(growth_rate = 0.1, death_rate = 0.3), CURRENT)])
+
+    assert store.points() == [dict(death_rate = 0.2, growth_rate = 0.1), dict(death_rate = 0.3, growth_rate = 0.1)]
+    result = store.query(death_rate = 0.2)
+    assert list(result['horizon']) == [100, 100]
+    assert [list(times) for times in result['extinction_time']] == [[5], [5]]
+
+def test_query_pads_missing_fields(tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.append([(dict(growth_rate = 0.1), LEGACY)])
+    store.append([(dict(growth_rate = 0.1), CURRENT)])
+
+    result = store.query(growth_rate = 0.1)
+    assert all(len(column) == 2 for column in result.values())
+    assert np.isnan(result['duration'][0]) and result['duration'][1] == 0.5
+    assert list(result['seed']) == [None, "1:0:2"]
+
+def test_mixed_segment_keeps_fields(tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.append([(dict(growth_rate = 0.1), LEGACY), (dict(growth_rate = 0.2), CURRENT)])
+
+    (_, legacy), (_, current) = store.records()
+    assert sorted(legacy) == ['extinction_time', 'horizon']
+    assert list(legacy['extinction_time']) == [3, 7, -1]
+    assert sorted(current) == ['duration', 'extinction_time', 'horizon', 'seed']
+    assert current['seed'] == "1:0:2"
+
+def test_compact_heterogeneous_records(tmp_path):
+    store = ResultStore(str(tmp_path))
+    store.append([(dict(growth_rate = 0.1), LEGACY)])
+    store.append([(dict(growth_rate = 0.1), CURRENT), (dict(growth_rate = 0.2), CURRENT)])
+    before = store.query()
+
+    store.compact()
+    assert len(os.listdir(str(tmp_path))) == 1
+
+    after = ResultStore(str(tmp_path)).query()
+    assert sorted(after) == sorted(before)
+    assert np.array_equal(after['horizon'], before['horizon'])
+    assert np.isnan(after['duration'][0]) and list(after['duration'][1:]) == [0.5, 0.5]
+    assert [list(times) for times in after['extinction_time']] == [[3, 7, -1], [5], [5]]
@@ -0,0 +1,29 @@
+from rng import replica_seed, generator, python_random, RandomBlock, get_state, set_state
+import snapshot
+
+def draws(seed, n = 5):
+    return generator(seed).random(n).tolist()
+
+def test_replica_seed_repeats():
+    assert draws(replica_seed(7, (0.1, 0.2), 3)) == draws(replica_seed(7, (0.1, 0.2), 3))
+    assert python_random(replica_seed(7, 0.5, 0)).random() == python_random(replica_seed(7, 0.5, 0)).random()
+
+def test_replica_seed_ignores_number_type():
+    assert draws(replica_seed(7, (1, 2), 0)) == draws(replica_seed(7, (1.0, 2.0), 0))
+
+def test_replica_seed_separates_addresses():
+    streams = [draws(replica_seed(7, (0.1, 0.2), 0)),
+               draws(replica_seed(7, (0.1, 0.2), 1)),
+               draws(replica_seed(7, (0.1, 0.3), 0)),
+               draws(replica_seed(8, (0.1, 0.2), 0))]
+    assert len(set(tuple(stream) for stream in streams)) == len(streams)
+
+def test_random_block_state_round_trip():
+    block = RandomBlock(3, size = 16)
+    block.uniforms(10)
+    state = snapshot.decode(snapshot.encode(get_state(block)))
+    expected = [block.random() for _ in range(40)]
+
+    other = RandomBlock(4, size = 16)
+    set_state(other, state)
+    assert [other.random() for _ in range(40)] == expected
@@ -0,0 +1,59 @@
+import os
+import sys
+import numpy as np
+import snapshot
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "sebastian"))
+from arraymodel import BatchModel
+import model3
+
+def params(seed):
+    terrain = np.ones((12, 12), dtype = int)
+    terrain[:6, :6] = 2
+    terrain[8, :] = 0
+    return dict(terrain = terrain, migration_rate = 0.1, growth_rate = 0.2, death_rate = 0.05,
+                initial_prey = 0.3, initial_predator = 0.1, seed = seed)
+
+def run(model, steps):
+    return [model.step().tolist() for _ in range(steps)]
+
+def test_save_and_load(tmp_path):
+    filename = str(tmp_path / "state.npz")
+    value = dict(seed = [1, 2], rate = 0.5, name = "a")
+    snapshot.save(filename, terrain = np.eye(3), value = snapshot.encode(value), t = 7)
+
+    state = snapshot.load(filename)
+    assert np.array_equal(state['terrain'], np.eye(3))
+    assert snapshot.decode(state['value']) == value
+    assert int(state['t']) == 7
+    assert os.listdir(str(tmp_path)) == ["state.npz"]
+
+def test_batch_model_round_trip(tmp_path):
+    filename = str(tmp_path / "batch.npz")
+    model = BatchModel(dict(params(1), death_rate = [0.05, 0.1, 0.2]), 3)
+    run(model, 10)
+    model.save_state(filename)
+
+    restored = BatchModel(params(2), 1)
+    restored.load_state(filename)
+    assert restored.t == model.t
+    assert np.array_equal(restored.rates['death_rate'], model.rates['death_rate'])
+    assert run(restored, 20) == run(model, 20)
+    assert np.array_equal(restored.preys, model.preys)
+    assert np.array_equal(restored.extinction_time, model.extinction_time)
+
+def test_model3_round_trip(tmp_path):
+    filename = str(tmp_path / "model3.npz")
+    model = model3.Model(params(1))
+    for _ in range(5):
+        model.step()
+    model.save_state(filename)
+
+    restored = model3.Model(params(2))
+    restored.load_state(filename)
+    for _ in range(10):
+        model.step()
+        restored.step()
+    assert restored.t == model.t
+    assert np.array_equal(restored.preys, model.preys)
+    assert np.array_equal(restored.predators, model.predators)
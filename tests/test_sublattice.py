@@ -0,0 +1,42 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "predator_prey"))
+# NOTE: predator_prey needs the noise package and matplotlib.mlab.griddata
+try:
+    from predator_prey import PredatorPreyModel, sublattice_colours, SUBLATTICE, PREY, PREDATOR
+except ImportError as error:
+    pytest.skip("predator_prey is not importable: {}".format(error), allow_module_level=True)
+from neighborhood import VON_NEUMANN, MOORE
+
+@pytest.mark.parametrize("directions, norm", [(VON_NEUMANN, 1), (MOORE, np.inf)])
+def test_colours_are_five_steps_apart(directions, norm):
+    colours = sublattice_colours((26, 26), directions)
+    for colour in np.unique(colours):
+        cells = np.argwhere(colours == colour)
+        distance = np.linalg.norm(cells[:, None] - cells[None, :], ord=norm, axis=2)
+        assert np.all(distance[~np.eye(len(cells), dtype=bool)] >= 5)
+
+def test_sublattice_counts_follow_species():
+    model = PredatorPreyModel(initial_predator_count=50, update_mode=SUBLATTICE, seed=1)
+    for _ in range(50):
+        model.step()
+        for type in (PREY, PREDATOR):
+            assert model.count(type) == np.count_nonzero(model.species == type)
+
+def test_sublattice_round_trip(tmp_path):
+    filename = str(tmp_path / "sublattice.npz")
+    model = PredatorPreyModel(initial_predator_count=50, update_mode=SUBLATTICE, seed=1)
+    for _ in range(5):
+        model.step()
+    model.save_state(filename)
+
+    restored = PredatorPreyModel(update_mode=SUBLATTICE, seed=2)
+    restored.load_state(filename)
+    for _ in range(10):
+        model.step()
+        restored.step()
+    assert np.array_equal(restored.species, model.species)
+    assert np.array_equal(restored.hunger, model.hunger)
@@ -0,0 +1,42 @@
+import numpy as np
+from survival import stack, from_counts, survival_curves, kaplan_meier, decay_rates, bootstrap_rates
+
+HORIZON = 5
+
+def test_from_counts():
+    assert from_counts([4, 4, 3, 1, 1]).tolist() == [2, 3, 3, -1]
+
+def test_stack_pads_points():
+    times, events, valid = stack([[1, -1], [2]], HORIZON)
+    assert times.tolist() == [[1, HORIZON], [2, HORIZON]]
+    assert events.tolist() == [[True, False], [True, False]]
+    assert valid.tolist() == [[True, True], [True, False]]
+
+def test_survival_curves():
+    times, events, valid = stack([[1, 3, -1, -1]], HORIZON)
+    assert np.allclose(survival_curves(times, valid, HORIZON), [[1, 0.75, 0.75, 0.5, 0.5]])
+    assert np.allclose(kaplan_meier(times, events, valid, HORIZON), survival_curves(times, valid, HORIZON))
+
+def test_kaplan_meier_with_censoring():
+    # Deaths at 1 and 3, one run censored at 2 and one that survived
+    times, events, valid = stack([[1, 2, 3, -1]], HORIZON, observed = [[True, False, True, False]])
+    assert np.allclose(kaplan_meier(times, events, valid, HORIZON), [[1, 0.75, 0.75, 0.375, 0.375]])
+
+def test_decay_rates_of_exponentials():
+    t = np.arange(20)
+    curves = np.exp(-np.outer([0.05, 0.3], t))
+    assert np.allclose(decay_rates(curves), [0.05, 0.3])
+
+    curves[:, :4] = 1
+    curves[:, 4:] = np.exp(-np.outer([0.05, 0.3], t[4:] - 4))
+    assert np.allclose(decay_rates(curves, start = 4), [0.05, 0.3])
+
+def test_decay_rates_without_survivors():
+    assert np.isnan(decay_rates(np.array([[1.0, 0.0, 0.0]])))[0]
+
+def test_bootstrap_rates_repeat():
+    times, events, valid = stack([[1, 2, 2, 4, -1], [3, -1]], HORIZON)
+    first = bootstrap_rates(times, events, valid, HORIZON, samples = 20, seed = 1)
+    second = bootstrap_rates(times, events, valid, HORIZON, samples = 20, seed = 1)
+    assert all(np.array_equal(a, b, equal_nan = True) for a, b in zip(first, second))
+    assert np.all(first[1] <= first[0]) and np.all(first[0] <= first[2])
@@ -0,0 +1,89 @@
+import os
+import time
+import math
+import pytest
+from rng import generator
+from sweep import Sweep
+from decisions import Count, SPRT, any_outcome, fraction
+from threshold import threshold_search
+
+POINTS = 12
+REPLICAS = 10
+
+def marked(point, replica, seed):
+    """ Leaves a file per call, returns point['outcome'] """
+    open(os.path.join(point['directory'], "%d-%d" % (point['index'], replica)), 'w').close()
+    time.sleep(point['delay'])
+    return point['outcome']
+
+def points(directory, outcome, delay = 0.0):
+    return [dict(index = i, directory = str(directory), outcome = outcome, delay = delay) for i in range(POINTS)]
+
+def calls(directory):
+    return len(os.listdir(str(directory)))
+
+def logistic(point, replica, seed):
+    """ Outcome with probability 1 / (1 + exp(-(x - 0.25) / 0.02)) """
+    p = 1 / (1 + math.exp(-(point['x'] - 0.25) / 0.02))
+    return generator(seed).random() < p
+
+def test_count_stops_after_first_hit(tmp_path):
+    with Sweep(processes = 1) as sweep:
+        decisions = sweep.decide(marked, points(tmp_path, True), REPLICAS, any_outcome())
+
+    assert calls(tmp_path) == POINTS
+    assert all(d == dict(verdict = True, hits = 1, total = 1) for d in decisions)
+
+def test_count_stops_once_impossible(tmp_path):
+    with Sweep(processes = 1) as sweep:
+        decisions = sweep.decide(marked, points(tmp_path, False), REPLICAS, fraction(0.3, REPLICAS))
+
+    # NOTE: 3 hits are impossible once 8 replicas missed
+    assert calls(tmp_path) == POINTS * 8
+    assert all(d == dict(verdict = False, hits = 0, total = 8) for d in decisions)
+
+def test_sprt_skips_replicas(tmp_path):
+    with Sweep(processes = 1) as sweep:
+        decisions = sweep.decide(marked, points(tmp_path, True), REPLICAS, SPRT(0.1, 0.9))
+
+    assert calls(tmp_path) == POINTS * 2
+    assert all(d == dict(verdict = True, hits = 2, total = 2) for d in decisions)
+
+def test_no_rule_runs_all_replicas(tmp_path):
+    with Sweep(processes = 1) as sweep:
+        decisions = sweep.decide(marked, points(tmp_path, True), REPLICAS, None)
+
+    assert calls(tmp_path) == POINTS * REPLICAS
+    assert all(d == dict(verdict = None, hits = REPLICAS, total = REPLICAS) for d in decisions)
+
+def test_parallel_skips_queued_replicas(tmp_path):
+    with Sweep(processes = 2) as sweep:
+        decisions = sweep.decide(marked, points(tmp_path, True, 0.01), REPLICAS, Count(1))
+
+    # NOTE: Only the first two chunks (one per worker, 15 calls each) run
+    # before the first verdicts come back, the later replicas are skipped
+    ran = calls(tmp_path)
+    assert ran <= 40
+    assert all(d['verdict'] for d in decisions)
+    assert sum(d['total'] for d in decisions) <= ran
+    assert sum(d['total'] for d in decisions) >= POINTS
+
+def test_threshold_fit_uses_complete_replicas():
+    critical = 0.25 + 0.02 * math.log(0.1 / 0.9)
+
+    with Sweep(processes = 1) as sweep:
+        result, = threshold_search(sweep, logistic, [dict()], 'x', 0.0, 0.5, 200,
+                                   level = 0.1, tolerance = 0.01, seed = 1)
+
+    assert all(total == 200 for _, total in result['samples'].values())
+    low, high = result['interval']
+    assert low <= critical <= high
+    assert result['lower'] <= result['upper']
+
+def test_threshold_without_fit_reports_bracket():
+    with Sweep(processes = 1) as sweep:
+        result, = threshold_search(sweep, logistic, [dict()], 'x', 0.0, 0.5, 20,
+                                   level = 0.1, seed = 1, fit = False)
+
+    assert result['samples'] == {}
+    assert result['interval'] == (result['lower'], result['upper'])
@@ -0,0 +1,61 @@
+import numpy as np
+from neighborhood import neighbor_table, choose, BOUNDED, PERIODIC, VON_NEUMANN, MOORE
+from agents import AgentTable
+from occupancy import OccupancyGrid, EMPTY
+
+def test_bounded_neighbors():
+    table = neighbor_table((3, 4))
+    assert sorted(table.positions((0, 0))) == [(0, 1), (1, 0)]
+    assert sorted(table.positions((1, 1))) == [(0, 1), (1, 0), (1, 2), (2, 1)]
+    assert table.indptr[-1] == np.sum(table.valid) == 2 * (3 * 3 + 2 * 4)
+
+def test_periodic_neighbors():
+    table = neighbor_table((3, 4), PERIODIC, MOORE)
+    assert table.valid.all()
+    assert len(set(table.positions((0, 0)))) == 8
+    assert (2, 3) in table.positions((0, 0))
+
+def test_tables_are_shared():
+    assert neighbor_table((3, 4), BOUNDED, VON_NEUMANN) is neighbor_table([3, 4])
+
+def test_choose():
+    options = np.array([[True, False, True], [False, False, False], [False, True, False]])
+    assert choose(options, np.array([0.0, 0.5, 0.9])).tolist() == [0, -1, 1]
+    assert choose(options, np.array([0.49, 0.0, 0.0]))[0] == 0
+    assert choose(options, np.array([0.51, 0.0, 0.0]))[0] == 2
+
+def test_agent_slots_are_recycled_on_commit():
+    agents = AgentTable(capacity = 2)
+    a, b, c = agents.create(1, 0, 0), agents.create(2, 1, 1), agents.create(2, 2, 2)
+    assert agents.capacity == 4 and len(agents) == 3
+
+    agents.remove(b)
+    assert agents.create(1, 3, 3) not in (a, b, c)
+    agents.commit()
+    assert agents.create(1, 4, 4) == b
+
+    agents.set_type(a, 2)
+    assert (agents.count(1), agents.count(2)) == (2, 2)
+    assert agents.pos(b) == (4, 4)
+
+def test_agent_state_round_trip():
+    agents = AgentTable(capacity = 4)
+    for x in range(3):
+        agents.create(1 + x % 2, x, 0)
+    agents.remove(1)
+    agents.commit()
+
+    restored = AgentTable.restore(agents.state())
+    assert restored.live().tolist() == agents.live().tolist()
+    assert (restored.count(1), restored.count(2)) == (2, 0)
+    assert restored.create(2, 5, 5) == agents.create(2, 5, 5)
+
+def test_occupancy_grid():
+    grid = OccupancyGrid((3, 3))
+    grid.place(4, (1, 1))
+    grid.move((1, 1), (2, 1))
+    assert grid[1, 1] == EMPTY and grid[2, 1] == 4
+    assert not grid.is_empty((2, 1)) and grid.is_empty((0, 0))
+    assert not grid.is_empty((3, 0))
+    grid.clear((2, 1))
+    assert (grid.ids == EMPTY).all()
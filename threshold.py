@@ -0,0 +1,176 @@
+from __future__ import division
+import math
+import numpy as np
+from decisions import fraction
+
+# Parallel threshold search over a sweep.
+#
+# Finds the value of one parameter (e.g. the death rate) at which a task
+# outcome (e.g. extinction) starts to happen. Instead of bisecting, every
+# wave evaluates `sections` candidates inside the bracket of every point at
+# once, so one wave narrows each bracket by a factor of sections + 1 and
+# keeps all workers busy. The first wave also checks the bracket ends.
+#
+# A candidate is above the threshold if at least the fraction `level` of its
+# replicas has the outcome; level = 1 / replicas means "any replica". The
+# replicas of a candidate are cancelled as soon as that verdict is settled,
+# another decision rule (see decisions.py) can be passed as `rule`.
+#
+# Those early stopped counts are biased (replicas with the outcome often
+# finish first, so a candidate above the threshold shows 1 / 1), so they
+# only move the brackets. Once a bracket is narrow enough, a last wave runs
+# all replicas of `sections` + 2 values across the bracket before the last
+# narrowing, and the critical value is where a logistic fit to these counts
+# crosses `level`; its confidence interval comes from the fit (delta method).
+# If the fit fails, e.g. because the outcomes are perfectly separated, or
+# with fit = False, the final bracket is reported instead.
+
+# Two sided normal quantiles of the supported confidence levels
+QUANTILES = {0.9: 1.6449, 0.95: 1.9600, 0.99: 2.5758}
+
+def logistic_fit(values, hits, totals, iterations = 50):
+    """ Fits P(outcome) = 1 / (1 + exp(-(a + b * value))), returns (a, b, covariance) """
+    X = np.column_stack([np.ones(len(values)), values])
+    beta = np.zeros(2)
+
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-X.dot(beta)))
+        gradient = X.T.dot(hits - totals * p)
+        hessian = (X.T * (totals * p * (1 - p))).dot(X) + 1e-9 * np.eye(2)
+        step = np.linalg.solve(hessian, gradient)
+        beta += step
+        if np.max(np.abs(step)) < 1e-10:
+            return beta[0], beta[1], np.linalg.inv(hessian)
+
+    return None
+
+def critical_value(values, hits, totals, level, confidence):
+    """ Returns (critical, (low, high)) of the logistic fit, or None """
+    values, hits, totals = (np.asarray(a, dtype=float) for a in (values, hits, totals))
+    if len(values) < 2 or np.all(hits == 0) or np.all(hits == totals):
+        return None
+
+    try:
+        fit = logistic_fit(values, hits, totals)
+    except np.linalg.LinAlgError:
+        return None
+    if fit is None or not fit[1] > 0:
+        return None
+
+    a, b, covariance = fit
+    offset = math.log(level / (1 - level))
+    critical = (offset - a) / b
+    gradient = np.array([-1 / b, -critical / b])
+    deviation = math.sqrt(max(gradient.dot(covariance).dot(gradient), 0))
+    z = QUANTILES[confidence]
+    return float(critical), (float(critical - z * deviation), float(critical + z * deviation))
+
+class Search:
+    """ State of the search of one point """
+    def __init__(self, point, lower, upper):
+        self.point = point
+        self.lower = lower
+        self.upper = upper
+        self.span = (lower, upper)
+        self.observations = {}
+        self.verdicts = {}
+        self.samples = {}
+
+    def observe(self, value, decision):
+        self.observations[value] = (decision['hits'], decision['total'])
+        self.verdicts[value] = decision['verdict']
+
+    def sample(self, value, decision):
+        """ Takes the counts of a value whose replicas all ran, for the fit """
+        self.samples[value] = (decision['hits'], decision['total'])
+
+    def fit_values(self, count):
+        """ `count` values across the bracket before the last narrowing """
+        lower, upper = self.span
+        return [lower + (upper - lower) * i / (count - 1) for i in range(count)]
+
+    def narrow(self, candidates):
+        """ Moves the bracket ends to the closest candidates on each side """
+        self.span = (self.lower, self.upper)
+        for value in sorted(candidates):
+            if self.lower < value < self.upper:
+                if self.verdicts[value]:
+                    self.upper = value
+                    break
+                self.lower = value
+
+    def result(self, level, confidence):
+        fit = None
+        if self.samples:
+            values = sorted(self.samples)
+            hits, totals = zip(*(self.samples[value] for value in values))
+            fit = critical_value(values, hits, totals, level, confidence)
+        if fit is None:
+            fit = ((self.lower + self.upper) / 2, (self.lower, self.upper))
+
+        critical, interval = fit
+        return dict(
+            point = self.point,
+            lower = self.lower,
+            upper = self.upper,
+            critical = critical,
+            interval = interval,
+            observations = dict(self.observations),
+            samples = dict(self.samples)
+        )
+
+def threshold_search(sweep, task, points, name, lower, upper, replicas,
+                     outcome = bool, level = 0.5, sections = 3, tolerance = 0.01,
+                     seed = None, confidence = 0.95, report = None, rule = None, fit = True):
+    """
+    Searches the threshold of parameter `name` in [lower, upper] for every
+    point (a dict of the other parameters) and returns one result dict per
+    point with the final bracket, the critical value and its interval.
+    `outcome(result)` maps a task result to True/False; `report(search)`
+    is called after every wave. With fit = False the last wave is skipped
+    and the critical value is the middle of the bracket.
+    """
+    searches = [Search(point, lower, upper) for point in points]
+    rule = rule or fraction(level, replicas)
+    first = True
+
+    while True:
+        active = [s for s in searches if s.upper - s.lower > tolerance]
+        if not active:
+            break
+
+        candidates = []
+        for search in active:
+            width = search.upper - search.lower
+            values = [search.lower + width * i / (sections + 1) for i in range(1, sections + 1)]
+            if first:
+                values = [search.lower] + values + [search.upper]
+            candidates.append(values)
+
+        calls = [dict(search.point, **{name: value})
+                 for search, values in zip(active, candidates) for value in values]
+        owners = [(search, value) for search, values in zip(active, candidates) for value in values]
+
+        for (search, value), decision in zip(owners, sweep.decide(task, calls, replicas, rule, outcome, seed)):
+            search.observe(value, decision)
+
+        for search, values in zip(active, candidates):
+            if first:
+                if search.verdicts[search.lower]:
+                    raise ValueError("Lower bound %f of %s is above the threshold" % (search.lower, name))
+                if not search.verdicts[search.upper]:
+                    raise ValueError("Upper bound %f of %s is below the threshold" % (search.upper, name))
+            search.narrow(values)
+            if report: report(search)
+
+        first = False
+
+    if fit:
+        values = [search.fit_values(sections + 2) for search in searches]
+        calls = [dict(search.point, **{name: value}) for search, group in zip(searches, values) for value in group]
+        owners = [(search, value) for search, group in zip(searches, values) for value in group]
+
+        for (search, value), decision in zip(owners, sweep.decide(task, calls, replicas, None, outcome, seed)):
+            search.sample(value, decision)
+
+    return [search.result(level, confidence) for search in searches]
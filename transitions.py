@@ -0,0 +1,54 @@
+import numpy as np
+
+# Terrain preference transition tables.
+#
+# Agents that prefer a terrain value p move to a neighbor with a weight of
+# 1 / |terrain - p|. Terrain and preferences are static, so the weights of
+# all cells are computed once per (terrain, preference). Occupied neighbors
+# are masked out when sampling, which then needs one uniform number and a
+# walk over at most four cumulative weights. The moves stay per agent,
+# because every move changes which neighbors are free for the next agent.
+
+# Lower bound for |terrain - p|, so a perfect match gets a huge but finite weight
+MINIMUM_DISTANCE = 1e-9
+
+class TransitionTable:
+    def __init__(self, terrain, preference, table):
+        self.table = table
+
+        distance = np.abs(np.asarray(terrain).reshape(-1)[table.dense] - preference)
+        self.weights = np.where(table.valid, 1 / np.maximum(distance, MINIMUM_DISTANCE), 0)
+
+        # (position, weight) lists for the per-agent loops, filled for visited cells
+        self.rows = {}
+
+    def row(self, pos):
+        try:
+            return self.rows[pos]
+        except KeyError:
+            cell = self.table.ravel(pos)
+            row = list(zip(self.table.positions(pos),
+                           self.weights[cell][self.table.valid[cell]].tolist()))
+            self.rows[pos] = row
+            return row
+
+    def choose(self, pos, is_free, u):
+        """
+        Picks a neighbor of `pos` for which `is_free` holds, using the
+        uniform number `u`. Returns None if there is no free neighbor.
+        """
+        options = [(new_pos, weight) for (new_pos, weight) in self.row(pos) if is_free(new_pos)]
+        if not options:
+            return None
+
+        r = u * sum(weight for (_, weight) in options)
+        for new_pos, weight in options:
+            r -= weight
+            if r < 0:
+                return new_pos
+        return options[-1][0]
+
+def transition_tables(terrain, preferences, table):
+    """ Builds a table for every entry of a {key: preference} dictionary """
+    return dict((key, TransitionTable(terrain, preference, table))
+                for key, preference in preferences.items())